@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import uuid
@@ -36,6 +36,8 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     full_name = Column(String)
+    base_currency = Column(String(3), default="USD")  # ISO 4217 code totals are reported in
+    change_version = Column(Integer, default=0, nullable=False)  # last sync version handed out
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -53,12 +55,24 @@ class Category(Base):
     type = Column(String, nullable=False)  # 'income' or 'expense'
     color = Column(String, default="#3B82F6")
     icon = Column(String, default="💰")
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    # NULL for shared system categories visible to every user
+    user_id = Column(String, ForeignKey("users.id"), nullable=True, index=True)
+    # Set on a user's customised copy of a system category
+    system_category_id = Column(String, ForeignKey("categories.id"), nullable=True)
+    version = Column(Integer)  # per-user change version, see services/sync.py
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (Index("ix_categories_user_version", "user_id", "version"),)
+    
     # Relationships
     user = relationship("User", back_populates="categories")
-    transactions = relationship("Transaction", back_populates="category")
+    # Deleting a category never loads its transactions: handlers move them
+    # with one UPDATE first, and transactions.category_id is not indexed
+    transactions = relationship("Transaction", back_populates="category", passive_deletes=True)
+    
+    @property
+    def is_system(self):
+        return self.user_id is None
 
 class Account(Base):
     __tablename__ = "accounts"
@@ -67,6 +81,7 @@ class Account(Base):
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)  # 'checking', 'savings', 'credit', etc.
     balance = Column(Float, default=0.0)
+    currency = Column(String(3), default="USD")
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -81,13 +96,22 @@ class Transaction(Base):
     amount = Column(Float, nullable=False)
     description = Column(String)
     type = Column(String, nullable=False)  # 'income', 'expense', 'transfer'
+    currency = Column(String(3), default="USD")
     date = Column(DateTime, default=datetime.utcnow)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     category_id = Column(String, ForeignKey("categories.id"))
     account_id = Column(String, ForeignKey("accounts.id"))
+    # category_id was predicted by the categorizer rather than set by the user
+    auto_categorized = Column(Boolean, default=False)
+    version = Column(Integer)  # per-user change version, see services/sync.py
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        Index("ix_transactions_user_date", "user_id", "date"),
+        Index("ix_transactions_user_version", "user_id", "version"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
@@ -103,8 +127,79 @@ class Budget(Base):
     period = Column(String, default="monthly")  # 'weekly', 'monthly', 'yearly'
     category_id = Column(String, ForeignKey("categories.id"))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    version = Column(Integer)  # per-user change version, see services/sync.py
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (Index("ix_budgets_user_version", "user_id", "version"),)
+    
     # Relationships
     user = relationship("User", back_populates="budgets")
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+    
+    # 1 unit of `currency` is worth `rate` units of the pivot currency from
+    # `date` until the currency's next row. Loaded from a local file.
+    currency = Column(String(3), primary_key=True)
+    date = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+
+class TransactionArchive(Base):
+    __tablename__ = "transaction_archives"
+    
+    # Manifest entry for one user's archived calendar year
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    year = Column(Integer, nullable=False)
+    path = Column(String, nullable=False)
+    row_count = Column(Integer, default=0)
+    min_date = Column(DateTime)
+    max_date = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchiveRollup(Base):
+    __tablename__ = "archive_rollups"
+    
+    # Pre-computed monthly totals of archived transactions, so reports over
+    # old years never have to open the archive files
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    type = Column(String, nullable=False)
+    category_id = Column(String)
+    currency = Column(String(3))
+    total = Column(Float, default=0.0)
+    count = Column(Integer, default=0)
+    last_date = Column(DateTime)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    
+    # Records a deleted transaction, category or budget so clients syncing
+    # from an older version learn to drop it. 'system_category' rows instead
+    # record when a shared system category was hidden from or shown again to
+    # one user, hence user_id in the key.
+    entity = Column(String, primary_key=True)  # 'transaction', 'category', 'budget', 'system_category'
+    entity_id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_sync_tombstones_user_version", "user_id", "version"),)
+
+class BudgetAlert(Base):
+    __tablename__ = "budget_alerts"
+    
+    # One row per budget, threshold and budget period, so re-running the
+    # evaluation job never raises the same alert twice
+    budget_id = Column(String, ForeignKey("budgets.id"), primary_key=True)
+    threshold = Column(Integer, primary_key=True)  # percent of the budget amount
+    period_start = Column(DateTime, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    spent = Column(Float, nullable=False)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_budget_alerts_user_created", "user_id", "created_at"),)
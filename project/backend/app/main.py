@@ -9,11 +9,9 @@ import os
 load_dotenv()
 
 # Import routers
-from .routers import auth, transactions, budgets, categories, analytics
-from .database import engine, Base
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from .routers import auth, transactions, budgets, categories, analytics, events, sync
+from .database import engine
+from . import migrations
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,6 +40,13 @@ app.include_router(transactions.router, prefix="/api/transactions", tags=["Trans
 app.include_router(budgets.router, prefix="/api/budgets", tags=["Budgets"])
 app.include_router(categories.router, prefix="/api/categories", tags=["Categories"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(events.router, prefix="/api/events", tags=["Events"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sync"])
+
+@app.on_event("startup")
+def prepare_database():
+    """Create or upgrade the schema and seed the shared system categories"""
+    migrations.upgrade(engine)
 
 @app.get("/")
 async def root():
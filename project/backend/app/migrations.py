@@ -0,0 +1,146 @@
+"""Brings an existing database up to the current models.
+
+``create_all`` only creates missing tables, so databases created by older
+releases also need
+
+* columns and indexes added since their tables were created,
+* ``categories.user_id`` made nullable for the shared system categories, and
+* the per-user copies of the default categories, which older releases
+  created on setup, folded into the shared system categories: their
+  transactions and budgets are pointed at the system ids and the copies
+  are deleted. Copies the user changed are kept as customised copies.
+
+Every step checks the live schema first, so running this on an up-to-date
+database is a no-op. Workers starting at the same time are serialised with
+a lock held for the whole upgrade.
+"""
+import logging
+
+from sqlalchemy import Engine, and_, exists, inspect, literal, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from .database import Base, Budget, Category, Transaction
+from .routers.categories import DEFAULT_CATEGORIES, ensure_system_categories, system_category_id
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every worker
+MIGRATION_LOCK_KEY = 2_716_028
+
+
+def _lock(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    elif conn.dialect.name == "sqlite":
+        # Take the write lock now rather than at the first write, so another
+        # worker can't inspect the schema mid-upgrade
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _column_ddl(conn, column) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=conn.dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        # Fills the new column on existing rows too
+        value = literal(default.arg, column.type).compile(
+            dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {value}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    for foreign_key in column.foreign_keys:
+        target = foreign_key.column
+        ddl += f" REFERENCES {target.table.name} ({target.name})"
+    return ddl
+
+
+def _add_missing_columns(conn) -> set:
+    """ALTER TABLE ... ADD COLUMN for model columns the table lacks; returns "table.column" names"""
+    inspector = inspect(conn)
+    added = set()
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(conn, column)}"))
+            added.add(f"{table.name}.{column.name}")
+    return added
+
+
+def _allow_system_categories(conn):
+    """Drop the NOT NULL constraint older releases put on categories.user_id"""
+    user_id = next(c for c in inspect(conn).get_columns("categories") if c["name"] == "user_id")
+    if user_id["nullable"]:
+        return
+    if conn.dialect.name == "sqlite":
+        # SQLite can't alter a constraint, so copy into a rebuilt table.
+        # Its indexes go with the old table and are recreated afterwards.
+        table = Category.__table__
+        ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.exec_driver_sql(ddl.replace("CREATE TABLE categories", "CREATE TABLE categories_rebuilt", 1))
+        columns = ", ".join(column.name for column in table.columns)
+        conn.exec_driver_sql(f"INSERT INTO categories_rebuilt ({columns}) SELECT {columns} FROM categories")
+        conn.exec_driver_sql("DROP TABLE categories")
+        conn.exec_driver_sql("ALTER TABLE categories_rebuilt RENAME TO categories")
+    else:
+        conn.execute(text("ALTER TABLE categories ALTER COLUMN user_id DROP NOT NULL"))
+
+
+def _create_missing_indexes(conn):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _fold_default_copies(conn) -> int:
+    """Point per-user default category copies at the system categories and delete them"""
+    categories = Category.__table__
+    system = categories.alias("system_categories")
+
+    # Link each copy to the system category of the same type and name
+    for type, defaults in DEFAULT_CATEGORIES.items():
+        for cat_data in defaults:
+            conn.execute(categories.update().where(
+                categories.c.user_id.isnot(None),
+                categories.c.system_category_id.is_(None),
+                categories.c.type == type,
+                categories.c.name == cat_data["name"],
+            ).values(system_category_id=system_category_id(type, cat_data["name"])))
+
+    # Copies still identical to their system category are redundant
+    unchanged = select(categories.c.id).where(
+        categories.c.user_id.isnot(None),
+        exists().where(and_(
+            system.c.id == categories.c.system_category_id,
+            system.c.name == categories.c.name,
+            system.c.color == categories.c.color,
+            system.c.icon == categories.c.icon,
+        )),
+    )
+    for model in (Transaction, Budget):
+        table = model.__table__
+        conn.execute(table.update().where(table.c.category_id.in_(unchanged)).values(
+            category_id=select(categories.c.system_category_id).where(
+                categories.c.id == table.c.category_id
+            ).scalar_subquery()
+        ))
+    return conn.execute(categories.delete().where(categories.c.id.in_(unchanged))).rowcount
+
+
+def upgrade(engine: Engine):
+    """Create missing tables, upgrade older ones and seed the system categories"""
+    with engine.begin() as conn:
+        _lock(conn)
+        Base.metadata.create_all(bind=conn)
+        added = _add_missing_columns(conn)
+        _allow_system_categories(conn)
+        _create_missing_indexes(conn)
+        ensure_system_categories(Session(bind=conn))
+        # Only databases from before shared system categories hold copies
+        if "categories.system_category_id" in added:
+            folded = _fold_default_copies(conn)
+            logger.info("Folded %d default category copies into the system categories", folded)
+        if added:
+            logger.info("Added columns: %s", ", ".join(sorted(added)))
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, extract
 from datetime import datetime, date
 from ..database import get_db, Transaction, Category, Budget, User
 from .auth import get_current_user
+from ..services.rate_limit import rate_limit, heavy_query
+from ..services import archive
+from ..services.fx import converted_amount
 
 router = APIRouter()
 
-@router.get("/dashboard")
-async def get_dashboard_data(
+@router.get("/dashboard", dependencies=[Depends(rate_limit(5)), Depends(heavy_query)])
+def get_dashboard_data(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -16,9 +19,10 @@ async def get_dashboard_data(
     
     current_month = datetime.now().month
     current_year = datetime.now().year
+    amount = converted_amount(current_user.base_currency)
     
     # Monthly totals
-    monthly_income = db.query(func.sum(Transaction.amount)).filter(
+    monthly_income = db.query(func.sum(amount)).select_from(Transaction).filter(
         and_(
             Transaction.user_id == current_user.id,
             Transaction.type == "income",
@@ -27,7 +31,7 @@ async def get_dashboard_data(
         )
     ).scalar() or 0
     
-    monthly_expenses = db.query(func.sum(Transaction.amount)).filter(
+    monthly_expenses = db.query(func.sum(amount)).select_from(Transaction).filter(
         and_(
             Transaction.user_id == current_user.id,
             Transaction.type == "expense",
@@ -37,14 +41,18 @@ async def get_dashboard_data(
     ).scalar() or 0
     
     # All-time totals
-    total_income = db.query(func.sum(Transaction.amount)).filter(
+    total_income = db.query(func.sum(amount)).select_from(Transaction).filter(
         and_(Transaction.user_id == current_user.id, Transaction.type == "income")
     ).scalar() or 0
     
-    total_expenses = db.query(func.sum(Transaction.amount)).filter(
+    total_expenses = db.query(func.sum(amount)).select_from(Transaction).filter(
         and_(Transaction.user_id == current_user.id, Transaction.type == "expense")
     ).scalar() or 0
     
+    archived = archive.rollup_totals(db, current_user, keys=("type",))
+    total_income += archived.get(("income",), {}).get("total", 0)
+    total_expenses += archived.get(("expense",), {}).get("total", 0)
+    
     # Recent transactions (last 5)
     recent_transactions = db.query(Transaction).filter(
         Transaction.user_id == current_user.id
@@ -55,10 +63,11 @@ async def get_dashboard_data(
         Category.name,
         Category.icon,
         Category.color,
-        func.sum(Transaction.amount).label("total")
-    ).join(
-        Transaction, Category.id == Transaction.category_id
-    ).filter(
+        func.sum(amount).label("total")
+    ).select_from(Transaction).join(
+        Category, Category.id == Transaction.category_id
+    )
+    category_expenses = category_expenses.filter(
         and_(
             Transaction.user_id == current_user.id,
             Transaction.type == "expense",
@@ -68,6 +77,7 @@ async def get_dashboard_data(
     ).group_by(Category.id, Category.name, Category.icon, Category.color).all()
     
     return {
+        "currency": current_user.base_currency,
         "monthly_summary": {
             "income": float(monthly_income),
             "expenses": float(monthly_expenses),
@@ -83,6 +93,7 @@ async def get_dashboard_data(
             {
                 "id": t.id,
                 "amount": t.amount,
+                "currency": t.currency,
                 "description": t.description,
                 "type": t.type,
                 "date": t.date.isoformat()
@@ -98,21 +109,23 @@ async def get_dashboard_data(
         ]
     }
 
-@router.get("/trends")
-async def get_trends(
-    months: int = 6,
+@router.get("/trends", dependencies=[Depends(rate_limit(5)), Depends(heavy_query)])
+def get_trends(
+    months: int = Query(6, ge=1, le=120),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get spending trends over time"""
     
+    amount = converted_amount(current_user.base_currency)
+    
     # Get monthly data for the last N months
     monthly_data = db.query(
         extract('year', Transaction.date).label('year'),
         extract('month', Transaction.date).label('month'),
         Transaction.type,
-        func.sum(Transaction.amount).label('total')
-    ).filter(
+        func.sum(amount).label('total')
+    ).select_from(Transaction).filter(
         Transaction.user_id == current_user.id
     ).group_by(
         extract('year', Transaction.date),
@@ -123,15 +136,23 @@ async def get_trends(
         extract('month', Transaction.date).desc()
     ).limit(months * 2).all()  # *2 for income and expense
     
+    # Archived months come from their rollups
+    rows = [(int(data.year), int(data.month), data.type, float(data.total)) for data in monthly_data]
+    archived = archive.rollup_totals(db, current_user, keys=("year", "month", "type"))
+    rows += [(year, month, type, totals["total"]) for (year, month, type), totals in archived.items()]
+    
     # Format the data
     trends = {}
-    for data in monthly_data:
-        month_key = f"{int(data.year)}-{int(data.month):02d}"
+    for year, month, type, total in rows:
+        month_key = f"{year}-{month:02d}"
         if month_key not in trends:
             trends[month_key] = {"income": 0, "expenses": 0}
-        trends[month_key][data.type if data.type != "expense" else "expenses"] = float(data.total)
+        key = type if type != "expense" else "expenses"
+        trends[month_key][key] = trends[month_key].get(key, 0) + total
+    trends = dict(sorted(trends.items(), reverse=True)[:months])
     
     return {
+        "currency": current_user.base_currency,
         "monthly_trends": trends,
         "period_months": months
     }
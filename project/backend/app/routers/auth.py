@@ -4,9 +4,12 @@ from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+from typing import Optional
 import os
 from ..database import get_db, User
+from ..services.fx import normalize_currency
+from ..services.rate_limit import rate_limit
 
 router = APIRouter()
 security = HTTPBearer()
@@ -22,6 +25,21 @@ class UserCreate(BaseModel):
     username: str
     password: str
     full_name: str = None
+    base_currency: str = None  # defaults to USD
+
+    @field_validator("base_currency")
+    @classmethod
+    def _normalize_base_currency(cls, value):
+        return normalize_currency(value)
+
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    base_currency: Optional[str] = None
+
+    @field_validator("base_currency")
+    @classmethod
+    def _normalize_base_currency(cls, value):
+        return normalize_currency(value)
 
 class UserLogin(BaseModel):
     email: str
@@ -36,7 +54,8 @@ class UserResponse(BaseModel):
     id: str
     email: str
     username: str
-    full_name: str
+    full_name: Optional[str] = None
+    base_currency: Optional[str] = None
     is_active: bool
     created_at: datetime
 
@@ -72,13 +91,16 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    return get_user_from_token(db, credentials.credentials)
+
+def get_user_from_token(db: Session, token: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -91,7 +113,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return user
 
 # Routes
-@router.post("/register", response_model=Token)
+@router.post("/register", response_model=Token, dependencies=[Depends(rate_limit(10))])
 async def register(user: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
     if get_user_by_email(db, user.email):
@@ -114,6 +136,8 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password,
         full_name=user.full_name
     )
+    if user.base_currency:
+        db_user.base_currency = user.base_currency
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
@@ -131,11 +155,12 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             "id": db_user.id,
             "email": db_user.email,
             "username": db_user.username,
-            "full_name": db_user.full_name
+            "full_name": db_user.full_name,
+            "base_currency": db_user.base_currency
         }
     }
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limit(10))])
 async def login(user_login: UserLogin, db: Session = Depends(get_db)):
     user = authenticate_user(db, user_login.email, user_login.password)
     if not user:
@@ -157,7 +182,8 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
             "id": user.id,
             "email": user.email,
             "username": user.username,
-            "full_name": user.full_name
+            "full_name": user.full_name,
+            "base_currency": user.base_currency
         }
     }
 
@@ -165,6 +191,24 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@router.put("/me", response_model=UserResponse)
+async def update_users_me(
+    user_update: UserUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update the current user's profile, including the currency totals are reported in"""
+    update_data = user_update.dict(exclude_unset=True)
+    if update_data.get("base_currency", "") is None:
+        raise HTTPException(status_code=400, detail="base_currency cannot be null")
+    for field, value in update_data.items():
+        setattr(current_user, field, value)
+    
+    current_user.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(current_user)
+    return current_user
+
 @router.get("/test")
 async def test_endpoint():
     return {"message": "Auth router is working!"}
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from ..database import get_db, Budget, User
+from ..database import get_db, Budget, BudgetAlert, User
 from .auth import get_current_user
+from ..services import events
+from ..services.fast_response import select_columns, rows_response
 
 router = APIRouter()
 
@@ -21,7 +23,7 @@ class BudgetResponse(BaseModel):
     amount: float
     spent: float
     period: str
-    category_id: str
+    category_id: Optional[str] = None  # None once its category is deleted
     user_id: str
     created_at: datetime
     updated_at: datetime
@@ -29,6 +31,31 @@ class BudgetResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BudgetAlertResponse(BaseModel):
+    budget_id: str
+    budget_name: str
+    threshold: int
+    period_start: datetime
+    spent: float
+    amount: float
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Columns available to the fast list path and ?fields= projection
+BUDGET_COLUMNS = {
+    "id": Budget.id,
+    "name": Budget.name,
+    "amount": Budget.amount,
+    "spent": Budget.spent,
+    "period": Budget.period,
+    "category_id": Budget.category_id,
+    "user_id": Budget.user_id,
+    "created_at": Budget.created_at,
+    "updated_at": Budget.updated_at,
+}
+
 # Routes
 @router.post("/", response_model=BudgetResponse)
 async def create_budget(
@@ -49,17 +76,54 @@ async def create_budget(
     db.commit()
     db.refresh(db_budget)
     
+    await events.publish_budget_change(
+        db, current_user, "created",
+        {name: getattr(db_budget, name) for name in BUDGET_COLUMNS}
+    )
+    
     return db_budget
 
 @router.get("/", response_model=List[BudgetResponse])
 async def get_budgets(
+    fast: bool = Query(False),
+    fields: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get user's budgets"""
+    if fast or fields:
+        names, columns = select_columns(BUDGET_COLUMNS, fields)
+        budgets = db.query(*columns).filter(Budget.user_id == current_user.id).all()
+        return rows_response(names, budgets)
+    
     budgets = db.query(Budget).filter(Budget.user_id == current_user.id).all()
     return budgets
 
+@router.get("/alerts", response_model=List[BudgetAlertResponse])
+async def get_budget_alerts(
+    since: Optional[datetime] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the user's budget threshold alerts, newest first"""
+    query = db.query(
+        BudgetAlert.budget_id,
+        Budget.name.label("budget_name"),
+        BudgetAlert.threshold,
+        BudgetAlert.period_start,
+        BudgetAlert.spent,
+        BudgetAlert.amount,
+        BudgetAlert.created_at
+    ).join(
+        Budget, Budget.id == BudgetAlert.budget_id
+    ).filter(BudgetAlert.user_id == current_user.id)
+    
+    if since:
+        query = query.filter(BudgetAlert.created_at > since)
+    
+    return query.order_by(BudgetAlert.created_at.desc()).limit(limit).all()
+
 @router.delete("/{budget_id}")
 async def delete_budget(
     budget_id: str,
@@ -75,7 +139,10 @@ async def delete_budget(
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
     
+    db.query(BudgetAlert).filter(BudgetAlert.budget_id == budget_id).delete(synchronize_session=False)
     db.delete(budget)
     db.commit()
     
+    await events.publish_budget_change(db, current_user, "deleted", {"id": budget_id})
+    
     return {"message": "Budget deleted successfully"}
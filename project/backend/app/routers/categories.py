@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import or_, func
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from ..database import get_db, Category, User
+import threading
+import uuid
+from ..database import get_db, Category, Transaction, Budget, User
 from .auth import get_current_user
+from ..services import archive, categorizer, events, sync
+from ..services.fx import converted_amount
+from ..services.fast_response import select_columns, rows_response
 
 router = APIRouter()
 
@@ -15,18 +22,41 @@ class CategoryCreate(BaseModel):
     color: str = "#3B82F6"
     icon: str = "💰"
 
+class CategoryUpdate(BaseModel):
+    name: Optional[str] = None
+    color: Optional[str] = None
+    icon: Optional[str] = None
+
 class CategoryResponse(BaseModel):
     id: str
     name: str
     type: str
     color: str
     icon: str
-    user_id: str
+    user_id: Optional[str] = None
+    system_category_id: Optional[str] = None
+    is_system: bool = False
     created_at: datetime
+    # Only filled in with ?with_stats=true
+    transaction_count: Optional[int] = None
+    total_amount: Optional[float] = None
+    last_used: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+# Columns available to the fast list path and ?fields= projection
+CATEGORY_COLUMNS = {
+    "id": Category.id,
+    "name": Category.name,
+    "type": Category.type,
+    "color": Category.color,
+    "icon": Category.icon,
+    "user_id": Category.user_id,
+    "system_category_id": Category.system_category_id,
+    "created_at": Category.created_at,
+}
+
 # Default categories data
 DEFAULT_CATEGORIES = {
     "expense": [
@@ -50,6 +80,101 @@ DEFAULT_CATEGORIES = {
     ]
 }
 
+# System categories are shared by every user and only change between
+# deploys, so they are loaded once per process and served from memory.
+_system_categories = None
+_system_lock = threading.Lock()
+
+def system_category_id(type: str, name: str) -> str:
+    """Stable id for a system category, identical across processes and deploys"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"finance-tracker/system-category/{type}/{name}"))
+
+def _insert_ignoring_conflicts(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(Category)
+    if dialect == "sqlite":
+        return sqlite.insert(Category)
+    raise NotImplementedError(f"Seeding system categories needs ON CONFLICT support, not available for {dialect}")
+
+def ensure_system_categories(db: Session):
+    """Insert any missing system categories from DEFAULT_CATEGORIES.
+
+    Rows another worker inserted first are skipped, so workers starting
+    together don't fail on the shared primary keys.
+    """
+    rows = [
+        {
+            "id": system_category_id(type, cat_data["name"]),
+            "name": cat_data["name"],
+            "type": type,
+            "color": cat_data["color"],
+            "icon": cat_data["icon"],
+            "user_id": None,
+            "created_at": datetime.utcnow(),
+        }
+        for type, categories in DEFAULT_CATEGORIES.items()
+        for cat_data in categories
+    ]
+    db.execute(_insert_ignoring_conflicts(db).values(rows).on_conflict_do_nothing(index_elements=["id"]))
+    db.commit()
+
+def get_system_categories(db: Session):
+    """Process-wide cached system categories as plain dicts"""
+    global _system_categories
+    if _system_categories is None:
+        with _system_lock:
+            if _system_categories is None:
+                rows = db.query(*CATEGORY_COLUMNS.values()).filter(Category.user_id.is_(None)).all()
+                _system_categories = [
+                    dict(zip(CATEGORY_COLUMNS, row), is_system=True) for row in rows
+                ]
+    return _system_categories
+
+def visible_system_categories(db: Session, user_id: str, type: str = None):
+    """System categories the user hasn't replaced with a customised copy"""
+    overridden = {
+        row.system_category_id for row in db.query(Category.system_category_id).filter(
+            Category.user_id == user_id,
+            Category.system_category_id.isnot(None)
+        ).all()
+    }
+    return [
+        category for category in get_system_categories(db)
+        if category["id"] not in overridden and (not type or category["type"] == type)
+    ]
+
+STAT_FIELDS = ("transaction_count", "total_amount", "last_used")
+
+def _category_stats(db: Session, user: User) -> dict:
+    """Transaction count, total (in base currency) and last use per category in one grouped query"""
+    amount = converted_amount(user.base_currency)
+    rows = db.query(
+        Transaction.category_id,
+        func.count(Transaction.id).label("transaction_count"),
+        func.sum(amount).label("total_amount"),
+        func.max(Transaction.date).label("last_used")
+    ).select_from(Transaction).filter(
+        Transaction.user_id == user.id,
+        Transaction.category_id.isnot(None)
+    ).group_by(Transaction.category_id).all()
+    stats = {
+        row.category_id: (row.transaction_count, float(row.total_amount or 0), row.last_used)
+        for row in rows
+    }
+    
+    # Fold in archived years from their rollups
+    for (category_id,), totals in archive.rollup_totals(db, user, keys=("category_id",)).items():
+        if category_id is None:
+            continue
+        count, total, last_used = stats.get(category_id, (0, 0.0, None))
+        stats[category_id] = (
+            count + totals["count"],
+            total + totals["total"],
+            max(d for d in (last_used, totals["last_date"]) if d is not None)
+        )
+    return stats
+
 # Routes
 @router.post("/", response_model=CategoryResponse)
 async def create_category(
@@ -75,61 +200,65 @@ async def create_category(
 @router.get("/", response_model=List[CategoryResponse])
 async def get_categories(
     type: str = None,
+    with_stats: bool = Query(False),
+    fast: bool = Query(False),
+    fields: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's categories"""
-    query = db.query(Category).filter(Category.user_id == current_user.id)
+    """Get the user's own categories merged with the shared system categories.
+
+    ``with_stats=true`` adds transaction count, total and last-used date for
+    every category, computed in a single grouped query.
+    """
+    if fast or fields:
+        names, columns = select_columns(CATEGORY_COLUMNS, fields)
+        query = db.query(*columns)
+    else:
+        query = db.query(Category)
+    query = query.filter(Category.user_id == current_user.id)
     
     if type:
         query = query.filter(Category.type == type)
     
     categories = query.all()
-    return categories
+    system_categories = visible_system_categories(db, current_user.id, type)
+    stats = _category_stats(db, current_user) if with_stats else None
+    empty_stats = (0, 0.0, None)
+    
+    if fast or fields:
+        system_rows = [tuple(category[name] for name in names) for category in system_categories]
+        rows = system_rows + [tuple(row) for row in categories]
+        if stats is not None:
+            id_index = names.index("id") if "id" in names else None
+            if id_index is None:
+                raise HTTPException(status_code=400, detail="'fields' must include 'id' when using with_stats")
+            rows = [row + stats.get(row[id_index], empty_stats) for row in rows]
+            names = names + list(STAT_FIELDS)
+        return rows_response(names, rows)
+    
+    if stats is not None:
+        # The cached system dicts are shared, so copy rather than mutate them
+        system_categories = [
+            {**category, **dict(zip(STAT_FIELDS, stats.get(category["id"], empty_stats)))}
+            for category in system_categories
+        ]
+        for category in categories:
+            for field, value in zip(STAT_FIELDS, stats.get(category.id, empty_stats)):
+                setattr(category, field, value)
+    return system_categories + categories
 
 @router.post("/setup-defaults")
 async def setup_default_categories(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Set up default categories for new users"""
-    
-    # Check if user already has categories
-    existing_categories = db.query(Category).filter(Category.user_id == current_user.id).first()
-    if existing_categories:
-        raise HTTPException(status_code=400, detail="Categories already exist for this user")
-    
-    created_categories = []
-    
-    # Create default expense categories
-    for cat_data in DEFAULT_CATEGORIES["expense"]:
-        category = Category(
-            name=cat_data["name"],
-            type="expense",
-            color=cat_data["color"],
-            icon=cat_data["icon"],
-            user_id=current_user.id
-        )
-        db.add(category)
-        created_categories.append(category)
-    
-    # Create default income categories
-    for cat_data in DEFAULT_CATEGORIES["income"]:
-        category = Category(
-            name=cat_data["name"],
-            type="income",
-            color=cat_data["color"],
-            icon=cat_data["icon"],
-            user_id=current_user.id
-        )
-        db.add(category)
-        created_categories.append(category)
-    
-    db.commit()
+    """Default categories are shared system categories; kept for older clients"""
+    ensure_system_categories(db)
     
     return {
-        "message": f"Created {len(created_categories)} default categories",
-        "categories_created": len(created_categories)
+        "message": "Default categories are shared system categories and are available to every user",
+        "categories_created": 0
     }
 
 @router.get("/{category_id}", response_model=CategoryResponse)
@@ -141,30 +270,146 @@ async def get_category(
     """Get a specific category"""
     category = db.query(Category).filter(
         Category.id == category_id,
-        Category.user_id == current_user.id
+        or_(Category.user_id == current_user.id, Category.user_id.is_(None))
+    ).first()
+    
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    return category
+
+@router.put("/{category_id}", response_model=CategoryResponse)
+async def update_category(
+    category_id: str,
+    category_update: CategoryUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update a category, copying system categories on first customisation"""
+    category = db.query(Category).filter(
+        Category.id == category_id,
+        or_(Category.user_id == current_user.id, Category.user_id.is_(None))
     ).first()
     
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    update_data = category_update.dict(exclude_unset=True)
+    
+    if category.is_system:
+        copy = db.query(Category).filter(
+            Category.user_id == current_user.id,
+            Category.system_category_id == category.id
+        ).first()
+        if not copy:
+            copy = Category(
+                name=category.name,
+                type=category.type,
+                color=category.color,
+                icon=category.icon,
+                user_id=current_user.id,
+                system_category_id=category.id
+            )
+            db.add(copy)
+            db.flush()
+            
+            # Point the user's existing rows at their copy
+            version = sync.next_version(db, current_user.id)
+            sync.record_system_category_change(db, current_user.id, category.id, version)
+            db.query(Transaction).filter(
+                Transaction.user_id == current_user.id,
+                Transaction.category_id == category.id
+            ).update({Transaction.category_id: copy.id, Transaction.version: version}, synchronize_session=False)
+            db.query(Budget).filter(
+                Budget.user_id == current_user.id,
+                Budget.category_id == category.id
+            ).update({Budget.category_id: copy.id, Budget.version: version}, synchronize_session=False)
+            archive.reassign_category(db, current_user.id, category.id, copy.id)
+            # The trained model still predicts the system category id
+            categorizer.invalidate(current_user.id)
+        category = copy
+    
+    for field, value in update_data.items():
+        setattr(category, field, value)
+    
+    db.commit()
+    db.refresh(category)
+    
     return category
 
 @router.delete("/{category_id}")
 async def delete_category(
     category_id: str,
+    reassign_to: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a category"""
+    """Delete a category, moving its transactions and budgets to ``reassign_to``.
+
+    Without ``reassign_to`` they become uncategorized. Either way every
+    affected row is moved with one UPDATE per table in the same transaction,
+    and archived years that used the category are rewritten too.
+    """
     category = db.query(Category).filter(
         Category.id == category_id,
         Category.user_id == current_user.id
     ).first()
     
     if not category:
+        if db.query(Category.id).filter(Category.id == category_id, Category.user_id.is_(None)).first():
+            raise HTTPException(status_code=403, detail="System categories cannot be deleted")
         raise HTTPException(status_code=404, detail="Category not found")
     
+    if reassign_to is not None:
+        if reassign_to == category_id:
+            raise HTTPException(status_code=400, detail="Cannot reassign a category to itself")
+        target = db.query(Category.type).filter(
+            Category.id == reassign_to,
+            or_(Category.user_id == current_user.id, Category.user_id.is_(None))
+        ).first()
+        if not target:
+            raise HTTPException(status_code=404, detail="Reassignment category not found")
+        if target.type != category.type:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Reassignment category must be of type '{category.type}'"
+            )
+    
+    version = sync.next_version(db, current_user.id)
+    transactions_moved = db.query(Transaction).filter(
+        Transaction.user_id == current_user.id,
+        Transaction.category_id == category_id
+    ).update(
+        {Transaction.category_id: reassign_to, Transaction.updated_at: datetime.utcnow(), Transaction.version: version},
+        synchronize_session=False
+    )
+    budgets_moved = db.query(Budget).filter(
+        Budget.user_id == current_user.id,
+        Budget.category_id == category_id
+    ).update(
+        {Budget.category_id: reassign_to, Budget.updated_at: datetime.utcnow(), Budget.version: version},
+        synchronize_session=False
+    )
+    transactions_moved += archive.reassign_category(db, current_user.id, category_id, reassign_to)
+    if category.system_category_id:
+        # The system category it replaced is visible again
+        sync.record_system_category_change(db, current_user.id, category.system_category_id, version)
     db.delete(category)
     db.commit()
     
-    return {"message": "Category deleted successfully"}
+    # The trained model may still predict the deleted category
+    categorizer.invalidate(current_user.id)
+    if await events.hub.wants(current_user.id):
+        await events.hub.publish(current_user.id, {
+            "type": "category.deleted",
+            "id": category_id,
+            "reassigned_to": reassign_to,
+            "transactions_moved": transactions_moved,
+            "budgets_moved": budgets_moved
+        })
+    
+    return {
+        "message": "Category deleted successfully",
+        "transactions_moved": transactions_moved,
+        "budgets_moved": budgets_moved
+    }
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional
+import asyncio
+import orjson
+from ..database import SessionLocal
+from .auth import get_user_from_token
+from ..services.events import hub
+
+router = APIRouter()
+optional_security = HTTPBearer(auto_error=False)
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+def _authenticate(token: str) -> str:
+    # Uses a short-lived session so an open stream doesn't pin a DB connection
+    db = SessionLocal()
+    try:
+        return get_user_from_token(db, token).id
+    finally:
+        db.close()
+
+def _format_event(event: dict) -> bytes:
+    return b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+
+# Routes
+@router.get("/")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-sent events stream of the user's transaction and budget changes.
+
+    Browsers' EventSource can't set headers, so the token may also be passed
+    as ``?token=``.
+    """
+    raw_token = credentials.credentials if credentials else token
+    if not raw_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_id = _authenticate(raw_token)
+    queue = await hub.subscribe(user_id)
+
+    async def event_stream():
+        try:
+            yield _format_event({"type": "ready"})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keep-alive\n\n"
+                    continue
+                yield _format_event(event)
+        finally:
+            hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,124 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+import heapq
+from ..database import get_db, Transaction, Category, Budget, SyncTombstone, User
+from .auth import get_current_user
+from .transactions import TRANSACTION_COLUMNS
+from .categories import CATEGORY_COLUMNS, visible_system_categories
+from .budgets import BUDGET_COLUMNS
+from ..services.sync import SYNCED_ENTITIES, SYSTEM_CATEGORY, next_version
+
+router = APIRouter()
+
+# Entities included in a sync response, keyed by response section
+SYNC_SOURCES = {
+    "transactions": (Transaction, TRANSACTION_COLUMNS),
+    "categories": (Category, CATEGORY_COLUMNS),
+    "budgets": (Budget, BUDGET_COLUMNS),
+}
+
+def _backfill_versions(db: Session, user_id: str):
+    """Give rows written before versioning existed a version, once"""
+    for model, _ in SYNC_SOURCES.values():
+        missing = db.query(model.id).filter(model.user_id == user_id, model.version.is_(None))
+        if missing.first():
+            version = next_version(db, user_id)
+            missing.update({model.version: version}, synchronize_session=False)
+    db.commit()
+
+def _page_upper_bound(db: Session, user_id: str, since: int, limit: int):
+    """Highest version to include so the page holds about ``limit`` changes.
+
+    Returns ``(upper, has_more)``. Pages always end on a whole version, so a
+    single bulk write is never split across pages.
+    """
+    sources = [model for model, _ in SYNC_SOURCES.values()] + [SyncTombstone]
+    versions = heapq.merge(*[
+        [row.version for row in db.query(model.version).filter(
+            model.user_id == user_id,
+            model.version > since
+        ).order_by(model.version).limit(limit + 1).all()]
+        for model in sources
+    ])
+    versions = list(versions)[:limit + 1]
+    if not versions:
+        return since, False
+    if len(versions) <= limit:
+        return versions[-1], False
+    return versions[limit - 1], True
+
+def _system_category_changes(db: Session, user_id: str, since: int, upper: int):
+    """System categories to upsert and delete for the page.
+
+    A full sync gets every system category the user can see. Later pages only
+    get those hidden or shown again (see sync.record_system_category_change)
+    within the page.
+    """
+    changed = db.query(SyncTombstone.entity_id, SyncTombstone.version).filter(
+        SyncTombstone.user_id == user_id,
+        SyncTombstone.entity == SYSTEM_CATEGORY,
+        SyncTombstone.version > since,
+        SyncTombstone.version <= upper
+    ).all()
+    if since > 0 and not changed:
+        return [], []
+    
+    versions = {row.entity_id: row.version for row in changed}
+    visible = {category["id"]: category for category in visible_system_categories(db, user_id)}
+    names = list(CATEGORY_COLUMNS)
+    if since == 0:
+        ids = list(visible)
+    else:
+        ids = [category_id for category_id in versions if category_id in visible]
+    upserted = [
+        dict({name: visible[category_id][name] for name in names}, version=versions.get(category_id, 0))
+        for category_id in ids
+    ]
+    deleted = [category_id for category_id in versions if category_id not in visible]
+    return upserted, deleted
+
+# Routes
+@router.get("/")
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Transactions, categories and budgets changed or deleted after version ``since``.
+
+    Categories include the shared system categories the user can see.
+
+    Pass the returned ``version`` as ``since`` on the next call; keep going
+    while ``has_more`` is true.
+    """
+    if since == 0:
+        _backfill_versions(db, current_user.id)
+    
+    upper, has_more = _page_upper_bound(db, current_user.id, since, limit)
+    
+    response = {"version": upper, "has_more": has_more}
+    for section, (model, columns) in SYNC_SOURCES.items():
+        names = list(columns) + ["version"]
+        rows = db.query(*columns.values(), model.version).filter(
+            model.user_id == current_user.id,
+            model.version > since,
+            model.version <= upper
+        ).order_by(model.version).all()
+        deleted = db.query(SyncTombstone.entity_id).filter(
+            SyncTombstone.user_id == current_user.id,
+            SyncTombstone.entity == SYNCED_ENTITIES[model],
+            SyncTombstone.version > since,
+            SyncTombstone.version <= upper
+        ).all()
+        response[section] = {
+            "upserted": [dict(zip(names, row)) for row in rows],
+            "deleted": [row.entity_id for row in deleted]
+        }
+    
+    upserted, deleted = _system_category_changes(db, current_user.id, since, upper)
+    response["categories"]["upserted"].extend(upserted)
+    response["categories"]["deleted"].extend(deleted)
+    
+    return ORJSONResponse(response)
@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
+from sqlalchemy import func, and_, or_, extract
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime, date
-from ..database import get_db, Transaction, Category, User
+import heapq
+from ..database import get_db, Transaction, Category, Account, User
 from .auth import get_current_user
+from ..services import archive, categorizer, events, sync
+from ..services.fx import converted_amount, normalize_currency, rate_cache
+from ..services.rate_limit import rate_limit, heavy_query
+from ..services.fast_response import select_columns, rows_response
 
 router = APIRouter()
 
@@ -14,32 +20,155 @@ class TransactionCreate(BaseModel):
     amount: float
     description: str = None
     type: str  # 'income', 'expense', 'transfer'
+    currency: str = None  # defaults to the account's, then the user's base currency
     category_id: str = None
     account_id: str = None
     date: datetime = None
 
+    @field_validator("currency")
+    @classmethod
+    def _normalize_currency(cls, value):
+        return normalize_currency(value)
+
 class TransactionUpdate(BaseModel):
     amount: Optional[float] = None
     description: Optional[str] = None
     type: Optional[str] = None
+    currency: Optional[str] = None
     category_id: Optional[str] = None
     account_id: Optional[str] = None
     date: Optional[datetime] = None
 
+    @field_validator("currency")
+    @classmethod
+    def _normalize_currency(cls, value):
+        return normalize_currency(value)
+
+class TransactionFilter(BaseModel):
+    type: Optional[str] = None
+    category_id: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    description: Optional[str] = None  # case-insensitive substring match
+
+class BulkTransactionUpdate(BaseModel):
+    ids: Optional[List[str]] = None
+    filter: Optional[TransactionFilter] = None
+    changes: TransactionUpdate
+
+class BulkTransactionDelete(BaseModel):
+    ids: Optional[List[str]] = None
+    filter: Optional[TransactionFilter] = None
+
 class TransactionResponse(BaseModel):
     id: str
     amount: float
-    description: str
+    currency: Optional[str] = None
+    base_amount: Optional[float] = None  # amount in the user's base currency
+    description: Optional[str] = None
     type: str
     date: datetime
-    category_id: str
-    account_id: str
+    category_id: Optional[str] = None
+    account_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
     class Config:
         from_attributes = True
 
+# Columns available to the fast list path and ?fields= projection
+TRANSACTION_COLUMNS = {
+    "id": Transaction.id,
+    "amount": Transaction.amount,
+    "currency": Transaction.currency,
+    "description": Transaction.description,
+    "type": Transaction.type,
+    "date": Transaction.date,
+    "category_id": Transaction.category_id,
+    "account_id": Transaction.account_id,
+    "created_at": Transaction.created_at,
+    "updated_at": Transaction.updated_at,
+}
+
+# Fields an update may not clear
+REQUIRED_FIELDS = ("amount", "type", "date")
+
+def _transaction_payload(transaction: Transaction) -> dict:
+    return {name: getattr(transaction, name) for name in TRANSACTION_COLUMNS}
+
+def _apply_filters(query, type=None, category_id=None, start_date=None, end_date=None, description=None):
+    if type:
+        query = query.filter(Transaction.type == type)
+    if category_id:
+        query = query.filter(Transaction.category_id == category_id)
+    if start_date:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date:
+        query = query.filter(Transaction.date <= end_date)
+    if description:
+        pattern = description.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(Transaction.description.ilike(f"%{pattern}%", escape="\\"))
+    return query
+
+def _account_currency(db: Session, user_id: str, account_id: str):
+    """Currency of one of the user's accounts; 404 if it isn't theirs"""
+    account = db.query(Account.currency).filter(
+        and_(Account.id == account_id, Account.user_id == user_id)
+    ).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return account.currency
+
+def _check_category(db: Session, user_id: str, category_id: str):
+    """404 unless the category is one of the user's or a system category"""
+    exists = db.query(Category.id).filter(
+        Category.id == category_id,
+        or_(Category.user_id == user_id, Category.user_id.is_(None))
+    ).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+def _affected(query):
+    """First-of-month dates and category ids of the rows a bulk query selects"""
+    rows = query.with_entities(
+        extract('year', Transaction.date),
+        extract('month', Transaction.date),
+        Transaction.category_id
+    ).distinct().all()
+    dates = {datetime(int(year), int(month), 1) for year, month, _ in rows if year is not None}
+    return list(dates), list({category_id for _, _, category_id in rows})
+
+def _bulk_target(db: Session, user_id: str, ids, filter):
+    """Ownership-checked query selecting the rows a bulk request addresses"""
+    if (ids is None) == (filter is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'ids' or 'filter'")
+    
+    query = db.query(Transaction).filter(Transaction.user_id == user_id)
+    if ids is not None:
+        if not ids:
+            raise HTTPException(status_code=400, detail="'ids' must not be empty")
+        return query.filter(Transaction.id.in_(ids))
+    
+    criteria = {field: value for field, value in filter.dict().items() if value not in (None, "")}
+    if not criteria:
+        raise HTTPException(status_code=400, detail="'filter' must set at least one field")
+    
+    # Archived rows can't be changed in place, so refuse rather than report a
+    # count that silently leaves them out
+    online_since = archive.online_since(db, user_id)
+    if online_since is not None and (not filter.start_date or filter.start_date < online_since.date()):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Filter reaches archived transactions; set start_date on or after {online_since.date()}"
+        )
+    return _apply_filters(query, **criteria)
+
+def _check_required(update_data: dict):
+    """Reject explicit nulls for columns a transaction can't be without"""
+    nulls = [field for field in REQUIRED_FIELDS if field in update_data and update_data[field] is None]
+    if nulls:
+        raise HTTPException(status_code=400, detail=f"{', '.join(nulls)} cannot be null")
+
 # Routes
 @router.post("/", response_model=TransactionResponse)
 async def create_transaction(
@@ -48,10 +177,17 @@ async def create_transaction(
     db: Session = Depends(get_db)
 ):
     """Create a new transaction"""
+    if transaction.category_id:
+        _check_category(db, current_user.id, transaction.category_id)
+    currency = transaction.currency
+    if not currency and transaction.account_id:
+        currency = _account_currency(db, current_user.id, transaction.account_id)
+    
     db_transaction = Transaction(
         amount=transaction.amount,
         description=transaction.description,
         type=transaction.type,
+        currency=currency or current_user.base_currency,
         category_id=transaction.category_id,
         account_id=transaction.account_id,
         date=transaction.date or datetime.utcnow(),
@@ -62,8 +198,30 @@ async def create_transaction(
     db.commit()
     db.refresh(db_transaction)
     
+    await events.publish_transaction_change(
+        db, current_user, "created", _transaction_payload(db_transaction),
+        dates=[db_transaction.date], category_ids=[db_transaction.category_id]
+    )
+    
     return db_transaction
 
+@router.post("/auto-categorize", dependencies=[Depends(rate_limit(10)), Depends(heavy_query)])
+async def auto_categorize_transactions(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Categorize all uncategorized transactions using the user's trained model"""
+    # Off the event loop, so heavy_query's slot bounds the training and UPDATEs
+    categorized = await run_in_threadpool(categorizer.categorize_uncategorized, db, current_user.id)
+    
+    if categorized and await events.hub.wants(current_user.id):
+        await events.hub.publish(current_user.id, {"type": "transactions.recategorized", "count": categorized})
+    
+    return {
+        "message": f"Categorized {categorized} transactions",
+        "categorized": categorized
+    }
+
 @router.get("/", response_model=List[TransactionResponse])
 async def get_transactions(
     skip: int = Query(0, ge=0),
@@ -72,24 +230,141 @@ async def get_transactions(
     category_id: Optional[str] = Query(None),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
+    fast: bool = Query(False),
+    fields: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's transactions with optional filtering"""
-    query = db.query(Transaction).filter(Transaction.user_id == current_user.id)
+    """Get user's transactions with optional filtering.
+
+    Pass ``fast=true`` (or a ``fields`` projection) to skip ORM loading and
+    Pydantic validation and serialize plain column tuples with orjson.
+    Both paths return the same fields, including ``base_amount``.
+    Archived years are read transparently when a page reaches back into them.
+    """
+    base_currency = current_user.base_currency
+    if fast or fields:
+        names, columns = select_columns({**TRANSACTION_COLUMNS, "base_amount": None}, fields)
+        selected = [name for name in names if name != "base_amount"]
+        # Trailing columns: what base_amount is converted from, if requested,
+        # then the sort key for merging with archived rows
+        trailing = ["amount", "currency", "date"] if "base_amount" in names else ["date"]
+        query = db.query(*[c for c in columns if c is not None], *[TRANSACTION_COLUMNS[name] for name in trailing])
+    else:
+        query = db.query(Transaction)
+    query = query.filter(Transaction.user_id == current_user.id)
+    query = _apply_filters(query, type, category_id, start_date, end_date)
+    query = query.order_by(Transaction.date.desc())
     
-    if type:
-        query = query.filter(Transaction.type == type)
-    if category_id:
-        query = query.filter(Transaction.category_id == category_id)
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
-    if end_date:
-        query = query.filter(Transaction.date <= end_date)
+    # Archived rows all predate online_since, so the archive is only read
+    # when the range reaches it and the online rows don't fill the page
+    # down to that boundary
+    online_since = archive.online_since(db, current_user.id)
+    if online_since is None or (start_date and start_date >= online_since.date()):
+        transactions = query.offset(skip).limit(limit).all()
+    else:
+        if fast or fields:
+            sort_key = lambda row: row[-1]
+        else:
+            sort_key = lambda t: t["date"] if isinstance(t, dict) else t.date
+        online = query.limit(skip + limit).all()
+        if len(online) == skip + limit and sort_key(online[-1]) >= online_since:
+            transactions = online[skip:]
+        else:
+            archived = archive.read_transactions(
+                db, current_user.id, type, category_id, start_date, end_date, limit=skip + limit
+            )
+            if fast or fields:
+                archived = [tuple(r[name] for name in selected + trailing) for r in archived]
+            merged = heapq.merge(online, archived, key=sort_key, reverse=True)
+            transactions = list(merged)[skip:skip + limit]
     
-    transactions = query.order_by(Transaction.date.desc()).offset(skip).limit(limit).all()
+    if fast or fields:
+        if "base_amount" in names:
+            positions = {name: i for i, name in enumerate(selected)}
+            transactions = [
+                tuple(
+                    rate_cache.convert(db, row[-3], row[-2], base_currency, row[-1])
+                    if name == "base_amount" else row[positions[name]]
+                    for name in names
+                )
+                for row in transactions
+            ]
+        return rows_response(names, transactions)
+    
+    for t in transactions:
+        if isinstance(t, dict):
+            t["base_amount"] = rate_cache.convert(db, t["amount"], t["currency"], base_currency, t["date"])
+        else:
+            t.base_amount = rate_cache.convert(db, t.amount, t.currency, base_currency, t.date)
     return transactions
 
+@router.patch("/bulk")
+async def bulk_update_transactions(
+    bulk_update: BulkTransactionUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Apply the same changes to many transactions in a single UPDATE"""
+    update_data = bulk_update.changes.dict(exclude_unset=True)
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No changes provided")
+    _check_required(update_data)
+    
+    if update_data.get("category_id"):
+        _check_category(db, current_user.id, update_data["category_id"])
+    if update_data.get("account_id") and "currency" not in update_data:
+        update_data["currency"] = _account_currency(db, current_user.id, update_data["account_id"])
+    
+    query = _bulk_target(db, current_user.id, bulk_update.ids, bulk_update.filter)
+    wants = await events.hub.wants(current_user.id)
+    dates, category_ids = _affected(query) if wants else ([], [])
+    
+    values = {getattr(Transaction, field): value for field, value in update_data.items()}
+    if "category_id" in update_data:
+        values[Transaction.auto_categorized] = False
+    values[Transaction.updated_at] = datetime.utcnow()
+    values[Transaction.version] = sync.next_version(db, current_user.id)
+    updated = query.update(values, synchronize_session=False)
+    db.commit()
+    
+    if updated and wants:
+        await events.publish_bulk_transaction_change(
+            db, current_user, "bulk_updated", {"count": updated, "changes": update_data},
+            dates=dates + [update_data.get("date")], category_ids=category_ids + [update_data.get("category_id")]
+        )
+    
+    return {
+        "message": f"Updated {updated} transactions",
+        "updated": updated
+    }
+
+@router.delete("/bulk")
+async def bulk_delete_transactions(
+    bulk_delete: BulkTransactionDelete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete many transactions in a single DELETE"""
+    query = _bulk_target(db, current_user.id, bulk_delete.ids, bulk_delete.filter)
+    wants = await events.hub.wants(current_user.id)
+    dates, category_ids = _affected(query) if wants else ([], [])
+    
+    sync.record_deletions(db, current_user.id, Transaction, query)
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    
+    if deleted and wants:
+        await events.publish_bulk_transaction_change(
+            db, current_user, "bulk_deleted", {"count": deleted},
+            dates=dates, category_ids=category_ids
+        )
+    
+    return {
+        "message": f"Deleted {deleted} transactions",
+        "deleted": deleted
+    }
+
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(
     transaction_id: str,
@@ -121,7 +396,16 @@ async def update_transaction(
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    old_date, old_category_id = transaction.date, transaction.category_id
     update_data = transaction_update.dict(exclude_unset=True)
+    _check_required(update_data)
+    if update_data.get("category_id"):
+        _check_category(db, current_user.id, update_data["category_id"])
+    if update_data.get("account_id") and "currency" not in update_data:
+        update_data["currency"] = _account_currency(db, current_user.id, update_data["account_id"])
+    if "category_id" in update_data:
+        # A category the user picked is a label the categorizer can learn from
+        update_data["auto_categorized"] = False
     for field, value in update_data.items():
         setattr(transaction, field, value)
     
@@ -129,6 +413,11 @@ async def update_transaction(
     db.commit()
     db.refresh(transaction)
     
+    await events.publish_transaction_change(
+        db, current_user, "updated", _transaction_payload(transaction),
+        dates=[old_date, transaction.date], category_ids=[old_category_id, transaction.category_id]
+    )
+    
     return transaction
 
 @router.delete("/{transaction_id}")
@@ -145,12 +434,18 @@ async def delete_transaction(
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    transaction_date, category_id = transaction.date, transaction.category_id
     db.delete(transaction)
     db.commit()
     
+    await events.publish_transaction_change(
+        db, current_user, "deleted", {"id": transaction_id},
+        dates=[transaction_date], category_ids=[category_id]
+    )
+    
     return {"message": "Transaction deleted successfully"}
 
-@router.get("/summary/monthly")
+@router.get("/summary/monthly", dependencies=[Depends(rate_limit(2))])
 async def get_monthly_summary(
     year: int = Query(datetime.now().year),
     month: int = Query(datetime.now().month),
@@ -158,9 +453,10 @@ async def get_monthly_summary(
     db: Session = Depends(get_db)
 ):
     """Get monthly transaction summary"""
+    amount = converted_amount(current_user.base_currency)
     
     # Total income and expenses for the month
-    income_total = db.query(func.sum(Transaction.amount)).filter(
+    income_total = db.query(func.sum(amount)).select_from(Transaction).filter(
         and_(
             Transaction.user_id == current_user.id,
             Transaction.type == "income",
@@ -169,7 +465,7 @@ async def get_monthly_summary(
         )
     ).scalar() or 0
     
-    expense_total = db.query(func.sum(Transaction.amount)).filter(
+    expense_total = db.query(func.sum(amount)).select_from(Transaction).filter(
         and_(
             Transaction.user_id == current_user.id,
             Transaction.type == "expense",
@@ -187,9 +483,19 @@ async def get_monthly_summary(
         )
     ).scalar() or 0
     
+    # Archived months are answered from their rollups
+    archived = archive.rollup_totals(db, current_user, keys=("type",), year=year, month=month)
+    for (kind,), totals in archived.items():
+        if kind == "income":
+            income_total += totals["total"]
+        elif kind == "expense":
+            expense_total += totals["total"]
+        transaction_count += totals["count"]
+    
     return {
         "year": year,
         "month": month,
+        "currency": current_user.base_currency,
         "total_income": float(income_total),
         "total_expenses": float(expense_total),
         "net_savings": float(income_total - expense_total),
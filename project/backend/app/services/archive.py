@@ -0,0 +1,291 @@
+"""Cold storage for old transactions.
+
+Calendar years that ended more than ``ARCHIVE_HORIZON_DAYS`` ago are moved
+out of the ``transactions`` table into one zstd-compressed Parquet file per
+user per year. A manifest (``transaction_archives``) records which years are
+archived and ``archive_rollups`` keeps monthly totals, so reports over old
+years never open the files and the list endpoint only reads the years a
+query actually covers.
+
+Run the job with ``python -m app.services.archive``.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import and_, extract
+from sqlalchemy.orm import Session
+
+from ..database import ArchiveRollup, Transaction, TransactionArchive, User
+from .fx import rate_cache
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./data/archive")
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", 730))
+# Ids per DELETE when removing archived rows from the online table
+DELETE_CHUNK_SIZE = 500
+
+SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("amount", pa.float64()),
+    ("currency", pa.string()),
+    ("description", pa.string()),
+    ("type", pa.string()),
+    ("date", pa.timestamp("us")),
+    ("category_id", pa.string()),
+    ("account_id", pa.string()),
+    ("created_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+])
+ARCHIVE_COLUMNS = SCHEMA.names
+
+
+def _archive_path(user_id: str, year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, user_id, f"{year}.parquet")
+
+
+def _year_bounds(year: int):
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def _to_datetime(value):
+    # Dates compare as midnight, matching the online filters
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
+
+
+def _read_file(path: str, filters=None) -> list:
+    if not os.path.exists(path):
+        return []
+    return pq.read_table(path, schema=SCHEMA, filters=filters).to_pylist()
+
+
+def _write_file(path: str, records: list):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records.sort(key=lambda r: r["date"] or datetime.min)
+    table = pa.Table.from_pylist(records, schema=SCHEMA)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def _rollups(user_id: str, year: int, records: list) -> list:
+    groups = defaultdict(lambda: {"total": 0.0, "count": 0, "last_date": None})
+    for record in records:
+        when = record["date"]
+        key = (when.month, record["type"], record["category_id"], record["currency"])
+        group = groups[key]
+        group["total"] += record["amount"] or 0.0
+        group["count"] += 1
+        if group["last_date"] is None or when > group["last_date"]:
+            group["last_date"] = when
+    return [
+        ArchiveRollup(
+            user_id=user_id,
+            year=year,
+            month=month,
+            type=type,
+            category_id=category_id,
+            currency=currency,
+            **values
+        )
+        for (month, type, category_id, currency), values in groups.items()
+    ]
+
+
+def archive_year(db: Session, user_id: str, year: int) -> int:
+    """Move one user's transactions for ``year`` into their archive file.
+
+    Rows back-dated into a year that is already archived are merged into the
+    existing file and its rollups rebuilt.
+    """
+    start, end = _year_bounds(year)
+    rows = db.query(*[getattr(Transaction, name) for name in ARCHIVE_COLUMNS]).filter(
+        and_(
+            Transaction.user_id == user_id,
+            Transaction.date >= start,
+            Transaction.date < end,
+        )
+    ).all()
+    if not rows:
+        return 0
+
+    manifest = db.query(TransactionArchive).filter(
+        TransactionArchive.user_id == user_id,
+        TransactionArchive.year == year
+    ).first()
+    path = manifest.path if manifest else _archive_path(user_id, year)
+
+    records = {record["id"]: record for record in _read_file(path)}
+    records.update({row.id: dict(zip(ARCHIVE_COLUMNS, row)) for row in rows})
+    records = list(records.values())
+    _write_file(path, records)
+
+    if manifest is None:
+        manifest = TransactionArchive(user_id=user_id, year=year, path=path)
+        db.add(manifest)
+    manifest.row_count = len(records)
+    manifest.min_date = min(r["date"] for r in records)
+    manifest.max_date = max(r["date"] for r in records)
+    manifest.archived_at = datetime.utcnow()
+
+    db.query(ArchiveRollup).filter(
+        ArchiveRollup.user_id == user_id,
+        ArchiveRollup.year == year
+    ).delete(synchronize_session=False)
+    db.add_all(_rollups(user_id, year, records))
+
+    # Delete by id so rows written after the SELECT above are never lost
+    ids = [row.id for row in rows]
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        db.query(Transaction).filter(
+            Transaction.id.in_(ids[i:i + DELETE_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+
+    db.commit()
+    return len(rows)
+
+
+def archive_old_transactions(db: Session, horizon_days: int = None, now: datetime = None) -> int:
+    """Archive every calendar year that ended before the horizon, for all users"""
+    horizon_days = ARCHIVE_HORIZON_DAYS if horizon_days is None else horizon_days
+    now = now or datetime.utcnow()
+    cutoff = datetime((now - timedelta(days=horizon_days)).year, 1, 1)
+
+    year = extract('year', Transaction.date)
+    groups = db.query(Transaction.user_id, year).filter(
+        Transaction.date < cutoff
+    ).group_by(Transaction.user_id, year).all()
+
+    archived = 0
+    for user_id, group_year in groups:
+        archived += archive_year(db, user_id, int(group_year))
+    return archived
+
+
+def archived_years(db: Session, user_id: str) -> dict:
+    """``{year: path}`` for every archived year of a user"""
+    return {
+        row.year: row.path
+        for row in db.query(TransactionArchive.year, TransactionArchive.path).filter(
+            TransactionArchive.user_id == user_id
+        ).all()
+    }
+
+
+def read_transactions(db: Session, user_id: str, type=None, category_id=None,
+                      start_date=None, end_date=None, description=None, limit=None) -> list:
+    """Archived transactions matching the list filters, newest first.
+
+    Only the files for years overlapping ``[start_date, end_date]`` are read,
+    newest year first, with the remaining filters pushed down into the
+    Parquet scan. Years don't overlap, so reading stops as soon as ``limit``
+    rows are in hand.
+    """
+    years = archived_years(db, user_id)
+    if not years:
+        return []
+
+    start = _to_datetime(start_date)
+    end = _to_datetime(end_date)
+    filters = []
+    if type:
+        filters.append(("type", "=", type))
+    if category_id:
+        filters.append(("category_id", "=", category_id))
+    if start:
+        filters.append(("date", ">=", start))
+    if end:
+        filters.append(("date", "<=", end))
+
+    records = []
+    for year in sorted(years, reverse=True):
+        year_start, year_end = _year_bounds(year)
+        if (start and start >= year_end) or (end and end < year_start):
+            continue
+        found = _read_file(years[year], filters or None)
+        if description:
+            needle = description.lower()
+            found = [r for r in found if r["description"] and needle in r["description"].lower()]
+        records.extend(found)
+        if limit is not None and len(records) >= limit:
+            break
+
+    records.sort(key=lambda r: r["date"], reverse=True)
+    return records[:limit] if limit is not None else records
+
+
+def reassign_category(db: Session, user_id: str, category_id: str, new_category_id) -> int:
+    """Move the user's archived transactions from ``category_id`` to ``new_category_id``.
+
+    Only the years whose rollups mention the category are rewritten. The
+    rollups are updated in the caller's transaction, which commits. Returns
+    the number of archived transactions moved.
+    """
+    rollups = db.query(ArchiveRollup).filter(
+        ArchiveRollup.user_id == user_id,
+        ArchiveRollup.category_id == category_id
+    )
+    years = {row.year for row in rollups.with_entities(ArchiveRollup.year).distinct()}
+    if not years:
+        return 0
+
+    paths = archived_years(db, user_id)
+    moved = 0
+    for year in sorted(years):
+        if year not in paths:
+            continue
+        records = _read_file(paths[year])
+        for record in records:
+            if record["category_id"] == category_id:
+                record["category_id"] = new_category_id
+                moved += 1
+        _write_file(paths[year], records)
+
+    rollups.update({ArchiveRollup.category_id: new_category_id}, synchronize_session=False)
+    return moved
+
+
+def online_since(db: Session, user_id: str):
+    """Start of the first year after the user's newest archive, or None"""
+    years = archived_years(db, user_id)
+    if not years:
+        return None
+    return _year_bounds(max(years))[1]
+
+
+def rollup_totals(db: Session, user: User, keys=("type",), year: int = None, month: int = None) -> dict:
+    """Archived totals grouped by ``keys``, converted to the user's base currency.
+
+    Returns ``{key tuple: {"total", "count", "last_date"}}``. Each month is
+    converted at the rate of its last archived transaction date.
+    """
+    query = db.query(ArchiveRollup).filter(ArchiveRollup.user_id == user.id)
+    if year is not None:
+        query = query.filter(ArchiveRollup.year == year)
+    if month is not None:
+        query = query.filter(ArchiveRollup.month == month)
+
+    totals = defaultdict(lambda: {"total": 0.0, "count": 0, "last_date": None})
+    for rollup in query.all():
+        group = totals[tuple(getattr(rollup, key) for key in keys)]
+        group["total"] += rate_cache.convert(
+            db, rollup.total, rollup.currency, user.base_currency, rollup.last_date
+        ) or 0.0
+        group["count"] += rollup.count
+        if group["last_date"] is None or rollup.last_date > group["last_date"]:
+            group["last_date"] = rollup.last_date
+    return dict(totals)
+
+
+if __name__ == "__main__":
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = archive_old_transactions(db)
+    finally:
+        db.close()
+    print(f"Archived {count} transactions")
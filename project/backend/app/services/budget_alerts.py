@@ -0,0 +1,101 @@
+"""Batch budget evaluation across all users.
+
+For each budget period the job runs one grouped ``INSERT ... SELECT`` per
+alert threshold: budgets are joined to their category's expense
+transactions inside the current period window, spend is summed in each
+user's base currency, and any budget at or past the threshold gets an alert
+row. Alerts are keyed by budget, threshold and period start, and inserts
+skip existing keys, so the job is idempotent and each crossing is reported
+once per period.
+
+Run it on a schedule (e.g. cron) with ``python -m app.services.budget_alerts``.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..database import Budget, BudgetAlert, Transaction, User
+from .budget_progress import PERIODS, period_start
+from .fx import DEFAULT_CURRENCY, converted_amount
+
+# Percent of the budget amount at which an alert is raised
+ALERT_THRESHOLDS = (80, 100)
+
+
+def _insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(BudgetAlert)
+    if dialect == "sqlite":
+        return sqlite.insert(BudgetAlert)
+    raise NotImplementedError(f"Budget alerts need ON CONFLICT support, not available for {dialect}")
+
+
+def _period_filter(period: str):
+    if period == "monthly":
+        # Unknown or missing periods are treated as monthly, as in budget_progress
+        return or_(Budget.period == period, Budget.period.is_(None), Budget.period.notin_(PERIODS))
+    return Budget.period == period
+
+
+def evaluate_budgets(db: Session, now: datetime = None) -> int:
+    """Raise alerts for every budget past a threshold; returns the number of new alerts"""
+    now = now or datetime.utcnow()
+    amount = converted_amount(func.coalesce(User.base_currency, DEFAULT_CURRENCY))
+    spent = func.sum(amount)
+
+    created = 0
+    for period in PERIODS:
+        start = period_start(period, now)
+        for threshold in ALERT_THRESHOLDS:
+            crossing = select(
+                Budget.id,
+                literal(threshold),
+                literal(start),
+                Budget.user_id,
+                spent,
+                Budget.amount,
+                literal(now),
+            ).select_from(Budget).join(
+                User, User.id == Budget.user_id
+            ).join(
+                Transaction,
+                and_(
+                    Transaction.user_id == Budget.user_id,
+                    Transaction.category_id == Budget.category_id,
+                    Transaction.type == "expense",
+                    Transaction.date >= start,
+                    Transaction.date <= now,
+                )
+            ).where(
+                and_(
+                    _period_filter(period),
+                    Budget.category_id.isnot(None),
+                    Budget.amount > 0,
+                )
+            ).group_by(
+                Budget.id, Budget.user_id, Budget.amount
+            ).having(spent >= Budget.amount * threshold / 100.0)
+
+            statement = _insert(db).from_select(
+                ["budget_id", "threshold", "period_start", "user_id", "spent", "amount", "created_at"],
+                crossing,
+            ).on_conflict_do_nothing(index_elements=["budget_id", "threshold", "period_start"])
+            result = db.execute(statement)
+            created += max(result.rowcount or 0, 0)
+
+    db.commit()
+    return created
+
+
+if __name__ == "__main__":
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = evaluate_budgets(db)
+    finally:
+        db.close()
+    print(f"Raised {count} budget alerts")
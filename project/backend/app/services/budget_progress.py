@@ -0,0 +1,72 @@
+"""Period-to-date spend for budgets."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from ..database import Budget, Transaction
+from .fx import converted_amount
+
+PERIODS = ("weekly", "monthly", "yearly")
+
+
+def period_start(period: str, now: datetime) -> datetime:
+    """Start of the current budget window (weeks start on Monday)"""
+    today = datetime(now.year, now.month, now.day)
+    if period == "weekly":
+        return today - timedelta(days=today.weekday())
+    if period == "yearly":
+        return datetime(now.year, 1, 1)
+    return datetime(now.year, now.month, 1)
+
+
+def budget_progress(db: Session, user_id: str, category_ids=None, now: datetime = None, base_currency: str = None):
+    """Spend to date for the user's budgets, optionally limited to some categories.
+
+    Every period window is summed in the same grouped query, so the cost is
+    one budget lookup plus one aggregate regardless of how many budgets match.
+    Spend is converted to ``base_currency`` in SQL.
+    """
+    now = now or datetime.utcnow()
+
+    budget_query = db.query(Budget).filter(Budget.user_id == user_id)
+    if category_ids is not None:
+        budget_query = budget_query.filter(Budget.category_id.in_(category_ids))
+    budgets = budget_query.all()
+    if not budgets:
+        return []
+
+    starts = {period: period_start(period, now) for period in PERIODS}
+    amount = converted_amount(base_currency)
+    totals = db.query(
+        Transaction.category_id,
+        *[
+            func.sum(case((Transaction.date >= start, amount), else_=0)).label(period)
+            for period, start in starts.items()
+        ]
+    ).select_from(Transaction).filter(
+        and_(
+            Transaction.user_id == user_id,
+            Transaction.type == "expense",
+            Transaction.category_id.in_({b.category_id for b in budgets}),
+            Transaction.date >= min(starts.values()),
+            Transaction.date <= now,
+        )
+    ).group_by(Transaction.category_id).all()
+    spent_by_category = {row.category_id: row for row in totals}
+
+    progress = []
+    for budget in budgets:
+        row = spent_by_category.get(budget.category_id)
+        period = budget.period if budget.period in PERIODS else "monthly"
+        spent = float(getattr(row, period) or 0) if row else 0.0
+        progress.append({
+            "id": budget.id,
+            "name": budget.name,
+            "amount": budget.amount,
+            "period": budget.period,
+            "category_id": budget.category_id,
+            "spent": spent,
+            "percentage": spent / budget.amount * 100 if budget.amount else 0,
+        })
+    return progress
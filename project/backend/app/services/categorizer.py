@@ -0,0 +1,263 @@
+"""Per-user transaction auto-categorization.
+
+Each user gets a small linear text model trained on their own labelled
+``Transaction.description`` -> ``Category`` pairs. Models are kept in an
+in-memory LRU cache, persisted to disk so restarts don't force a retrain,
+and updated incrementally once enough new labels have accumulated.
+Categories the model filled in are flagged ``auto_categorized`` and never
+used as labels.
+"""
+from collections import OrderedDict
+from datetime import datetime
+import os
+import threading
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from ..database import Transaction, Category
+from . import sync
+
+MODEL_DIR = os.getenv("CATEGORIZER_MODEL_DIR", "./models/categorizer")
+MAX_CACHED_MODELS = int(os.getenv("CATEGORIZER_CACHE_SIZE", 256))
+
+# Minimum labelled transactions before a model is trained at all
+MIN_TRAINING_SAMPLES = 10
+# New labels needed before a cached model is updated
+RETRAIN_THRESHOLD = 50
+# Predictions below this probability are left uncategorized
+MIN_CONFIDENCE = 0.4
+# Rows categorized per UPDATE batch
+BATCH_SIZE = 10000
+
+# Stateless, so one instance is shared by every user's model and the
+# feature space never has to be refitted when new labels arrive.
+_vectorizer = HashingVectorizer(
+    analyzer="char_wb",
+    ngram_range=(3, 5),
+    n_features=2 ** 18,
+    alternate_sign=False,
+    lowercase=True,
+)
+
+
+class CategoryModel:
+    """A trained classifier plus the metadata needed to keep it current"""
+
+    def __init__(self, classifier: SGDClassifier, category_types: dict, trained_at: datetime, sample_count: int):
+        self.classifier = classifier
+        self.category_types = category_types  # category_id -> 'income' / 'expense'
+        self.trained_at = trained_at
+        self.sample_count = sample_count
+
+    def predict(self, descriptions, types, min_confidence: float = MIN_CONFIDENCE):
+        """Predict a category id (or None) for every description in one vectorized pass"""
+        if not descriptions:
+            return []
+
+        features = _vectorizer.transform([d or "" for d in descriptions])
+        probabilities = self.classifier.predict_proba(features)
+        classes = self.classifier.classes_
+
+        # Only allow categories whose type matches the transaction type
+        class_types = np.array([self.category_types.get(c) for c in classes], dtype=object)
+        row_types = np.array(types, dtype=object)
+        probabilities = np.where(class_types[None, :] == row_types[:, None], probabilities, 0.0)
+
+        best = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(best)), best]
+        return [
+            classes[i] if score >= min_confidence else None
+            for i, score in zip(best, confidence)
+        ]
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _model_path(user_id: str) -> str:
+    return os.path.join(MODEL_DIR, f"{user_id}.joblib")
+
+
+def _labelled_query(db: Session, user_id: str):
+    return db.query(
+        Transaction.description,
+        Transaction.category_id,
+        Category.type,
+    ).join(
+        Category, Category.id == Transaction.category_id
+    ).filter(
+        and_(
+            Transaction.user_id == user_id,
+            Transaction.description.isnot(None),
+            Transaction.auto_categorized.isnot(True),
+        )
+    )
+
+
+def _new_classifier() -> SGDClassifier:
+    return SGDClassifier(loss="log_loss", alpha=1e-5, max_iter=20, tol=None)
+
+
+def _train(db: Session, user_id: str):
+    rows = _labelled_query(db, user_id).all()
+    category_types = {row.category_id: row.type for row in rows}
+    if len(rows) < MIN_TRAINING_SAMPLES or len(category_types) < 2:
+        return None
+
+    features = _vectorizer.transform([row.description for row in rows])
+    labels = np.array([row.category_id for row in rows], dtype=object)
+
+    classifier = _new_classifier()
+    classifier.fit(features, labels)
+    return CategoryModel(classifier, category_types, datetime.utcnow(), len(rows))
+
+
+def _update(db: Session, user_id: str, model: CategoryModel):
+    """Fold labels added since the model was trained into it.
+
+    Falls back to a full retrain when the new labels introduce categories the
+    classifier has never seen, since ``partial_fit`` can't grow its classes.
+    """
+    rows = _labelled_query(db, user_id).filter(Transaction.updated_at > model.trained_at).all()
+    if not rows:
+        return model
+
+    new_types = {row.category_id: row.type for row in rows}
+    if not set(new_types).issubset(model.classifier.classes_):
+        return _train(db, user_id)
+
+    features = _vectorizer.transform([row.description for row in rows])
+    labels = np.array([row.category_id for row in rows], dtype=object)
+    model.classifier.partial_fit(features, labels)
+    model.category_types.update(new_types)
+    model.trained_at = datetime.utcnow()
+    model.sample_count += len(rows)
+    return model
+
+
+def _pending_labels(db: Session, user_id: str, since: datetime) -> int:
+    return db.query(func.count(Transaction.id)).filter(
+        and_(
+            Transaction.user_id == user_id,
+            Transaction.category_id.isnot(None),
+            Transaction.auto_categorized.isnot(True),
+            Transaction.updated_at > since,
+        )
+    ).scalar() or 0
+
+
+def _remember(user_id: str, model: CategoryModel):
+    with _lock:
+        _cache[user_id] = model
+        _cache.move_to_end(user_id)
+        while len(_cache) > MAX_CACHED_MODELS:
+            _cache.popitem(last=False)
+
+
+def _save(user_id: str, model: CategoryModel):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp_path = _model_path(user_id) + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, _model_path(user_id))
+
+
+def _load(user_id: str):
+    path = _model_path(user_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception:
+        return None
+
+
+def get_model(db: Session, user_id: str):
+    """Return the user's model, training or updating it if needed.
+
+    Returns None when the user doesn't have enough labelled transactions yet.
+    """
+    with _lock:
+        model = _cache.get(user_id)
+        if model is not None:
+            _cache.move_to_end(user_id)
+
+    if model is None:
+        model = _load(user_id)
+
+    if model is None:
+        model = _train(db, user_id)
+        if model is None:
+            return None
+        _save(user_id, model)
+    elif _pending_labels(db, user_id, model.trained_at) >= RETRAIN_THRESHOLD:
+        model = _update(db, user_id, model)
+        if model is None:
+            return None
+        _save(user_id, model)
+
+    _remember(user_id, model)
+    return model
+
+
+def invalidate(user_id: str):
+    """Drop a user's cached and persisted model"""
+    with _lock:
+        _cache.pop(user_id, None)
+    try:
+        os.remove(_model_path(user_id))
+    except FileNotFoundError:
+        pass
+
+
+def predict_categories(db: Session, user_id: str, descriptions, types):
+    """Predict category ids for a batch of transactions, None where unsure"""
+    model = get_model(db, user_id)
+    if model is None:
+        return [None] * len(descriptions)
+    return model.predict(descriptions, types)
+
+
+def categorize_uncategorized(db: Session, user_id: str) -> int:
+    """Fill in ``category_id`` for every uncategorized transaction of a user.
+
+    Rows are predicted and written in batches of ``BATCH_SIZE`` so a large
+    import costs a handful of model calls and bulk UPDATEs, not one per row.
+    """
+    model = get_model(db, user_id)
+    if model is None:
+        return 0
+
+    rows = db.query(Transaction.id, Transaction.description, Transaction.type).filter(
+        and_(
+            Transaction.user_id == user_id,
+            Transaction.category_id.is_(None),
+            Transaction.description.isnot(None),
+        )
+    ).all()
+
+    categorized = 0
+    now = datetime.utcnow()
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        predictions = model.predict([r.description for r in batch], [r.type for r in batch])
+        mappings = [
+            {"id": row.id, "category_id": category_id, "auto_categorized": True, "updated_at": now}
+            for row, category_id in zip(batch, predictions)
+            if category_id is not None
+        ]
+        if mappings:
+            # Bulk mappings skip the flush hook that stamps sync versions
+            version = sync.next_version(db, user_id)
+            for mapping in mappings:
+                mapping["version"] = version
+            db.bulk_update_mappings(Transaction, mappings)
+            categorized += len(mappings)
+
+    db.commit()
+    return categorized
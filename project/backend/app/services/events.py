@@ -0,0 +1,316 @@
+"""Per-user live update hub.
+
+Write handlers publish compact deltas here and ``GET /api/events`` streams
+them to connected clients, so the dashboard doesn't have to re-poll the full
+query set to notice a change. Delivery goes through a broker: the local one
+fans out within this process, the Redis one (``REDIS_URL``) fans out across
+every API worker.
+"""
+import asyncio
+from datetime import datetime
+import logging
+import os
+
+import orjson
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from ..database import Transaction, User
+from .budget_progress import budget_progress
+from .fx import converted_amount
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Each user's events go to their own channel, so PUBSUB NUMSUB on it says
+# whether any worker is streaming to that user
+REDIS_CHANNEL_PREFIX = "finance-tracker:events:"
+# Always subscribed, so the listener stays in pub/sub mode with no streams open
+REDIS_CONTROL_CHANNEL = "finance-tracker:events"
+# Seconds a publish or subscriber check may wait on Redis before giving up,
+# so a partitioned Redis can't stall the write handlers
+REDIS_TIMEOUT = float(os.getenv("EVENTS_REDIS_TIMEOUT", 0.5))
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+# Events buffered per connection before the client is told to resync
+QUEUE_SIZE = 100
+
+
+class LocalBroker:
+    """Delivers events to subscribers in this process only"""
+
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def watch(self, user_id: str):
+        pass
+
+    def unwatch(self, user_id: str):
+        pass
+
+    async def publish(self, user_id: str, event: dict):
+        if self._deliver:
+            self._deliver(user_id, event)
+
+    async def may_have_subscribers(self, hub, user_id: str) -> bool:
+        return hub.has_local_subscribers(user_id)
+
+
+class RedisBroker:
+    """Relays events through Redis pub/sub so every worker sees them.
+
+    A worker subscribes to a user's channel only while it holds a stream for
+    that user. The listener reconnects with backoff and resubscribes if the
+    pub/sub connection drops.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+        # The listener blocks on reads between events, so it only bounds connecting
+        self._listener = redis.from_url(url, socket_connect_timeout=REDIS_TIMEOUT)
+        self._users = set()
+        self._pubsub = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @staticmethod
+    def _channel(user_id: str) -> str:
+        return REDIS_CHANNEL_PREFIX + user_id
+
+    async def start(self, deliver):
+        # Connecting happens in the listener, so an unreachable Redis never
+        # fails the request that started the hub
+        self._task = asyncio.create_task(self._listen(deliver))
+
+    async def _connect(self):
+        async with self._lock:
+            pubsub = self._listener.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(REDIS_CONTROL_CHANNEL, *[self._channel(u) for u in self._users])
+            except Exception:
+                await self._close(pubsub)
+                raise
+            self._pubsub = pubsub
+        return pubsub
+
+    @staticmethod
+    async def _close(pubsub):
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def _listen(self, deliver):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                pubsub = await self._connect()
+                delay = RECONNECT_MIN_DELAY
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        payload = orjson.loads(message["data"])
+                        deliver(payload["user_id"], payload["event"])
+                    except Exception:
+                        logger.exception("Dropping malformed event from Redis")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis event listener failed, reconnecting in %ss", delay)
+
+            pubsub, self._pubsub = self._pubsub, None
+            if pubsub is not None:
+                await self._close(pubsub)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def watch(self, user_id: str):
+        self._users.add(user_id)
+        async with self._lock:
+            if self._pubsub is None:
+                return  # subscribed when the listener (re)connects
+            try:
+                await self._pubsub.subscribe(self._channel(user_id))
+            except Exception:
+                logger.exception("Failed to subscribe to events for user %s", user_id)
+
+    def unwatch(self, user_id: str):
+        self._users.discard(user_id)
+        asyncio.get_running_loop().create_task(self._unsubscribe(user_id))
+
+    async def _unsubscribe(self, user_id: str):
+        async with self._lock:
+            if self._pubsub is None or user_id in self._users:
+                return
+            try:
+                await self._pubsub.unsubscribe(self._channel(user_id))
+            except Exception:
+                logger.exception("Failed to unsubscribe from events for user %s", user_id)
+
+    async def publish(self, user_id: str, event: dict):
+        await self._redis.publish(self._channel(user_id), orjson.dumps({"user_id": user_id, "event": event}))
+
+    async def may_have_subscribers(self, hub, user_id: str) -> bool:
+        if hub.has_local_subscribers(user_id):
+            return True
+        counts = await self._redis.pubsub_numsub(self._channel(user_id))
+        return any(count for _, count in counts)
+
+
+class EventHub:
+    """Tracks open event streams per user and routes published events to them.
+
+    Live updates are best effort: broker failures are logged and never
+    propagate to the write that triggered them.
+    """
+
+    def __init__(self, broker=None):
+        self.broker = broker
+        self._subscribers = {}
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    def _get_broker(self):
+        if self.broker is None:
+            self.broker = RedisBroker(REDIS_URL) if REDIS_URL else LocalBroker()
+        return self.broker
+
+    async def _ensure_started(self):
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self._get_broker().start(self._deliver)
+                self._started = True
+
+    def has_local_subscribers(self, user_id: str) -> bool:
+        return bool(self._subscribers.get(user_id))
+
+    def _deliver(self, user_id: str, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The client fell behind; it has to refetch anyway
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    async def subscribe(self, user_id: str) -> asyncio.Queue:
+        await self._ensure_started()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        queues = self._subscribers.setdefault(user_id, set())
+        queues.add(queue)
+        if len(queues) == 1:
+            await self.broker.watch(user_id)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+                self.broker.unwatch(user_id)
+
+    async def wants(self, user_id: str) -> bool:
+        """Whether anyone, on any worker, might receive events for this user"""
+        try:
+            await self._ensure_started()
+            return await self.broker.may_have_subscribers(self, user_id)
+        except Exception:
+            logger.exception("Failed to check for event subscribers")
+            return False
+
+    async def publish(self, user_id: str, event: dict):
+        try:
+            await self._ensure_started()
+            await self.broker.publish(user_id, event)
+        except Exception:
+            logger.exception("Failed to publish event")
+
+
+hub = EventHub()
+
+
+def monthly_totals(db: Session, user_id: str, year: int, month: int, base_currency: str = None) -> dict:
+    """Income and expense totals for one month in a single grouped query"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    amount = converted_amount(base_currency)
+    rows = db.query(
+        Transaction.type,
+        func.sum(amount).label("total")
+    ).select_from(Transaction).filter(
+        and_(
+            Transaction.user_id == user_id,
+            Transaction.date >= start,
+            Transaction.date < end,
+        )
+    ).group_by(Transaction.type).all()
+    totals = {row.type: float(row.total or 0) for row in rows}
+    income = totals.get("income", 0.0)
+    expenses = totals.get("expense", 0.0)
+    return {
+        "year": year,
+        "month": month,
+        "income": income,
+        "expenses": expenses,
+        "savings": income - expenses,
+    }
+
+
+async def publish_transaction_change(db: Session, user: User, kind: str, payload: dict, dates=(), category_ids=()):
+    """Publish a transaction delta plus the totals and budget progress it affects.
+
+    ``kind`` is 'created', 'updated' or 'deleted'; ``dates`` and
+    ``category_ids`` are the old and new values touched by the write.
+    """
+    if not await hub.wants(user.id):
+        return
+
+    await hub.publish(user.id, {"type": f"transaction.{kind}", "transaction": payload})
+    await _publish_aggregates(db, user, dates, category_ids)
+
+
+async def publish_bulk_transaction_change(db: Session, user: User, kind: str, event: dict, dates=(), category_ids=()):
+    """Publish a bulk write's summary plus the totals and budget progress it affects.
+
+    ``kind`` is 'bulk_updated' or 'bulk_deleted'. The affected dates and
+    categories have to be read before the write, so callers check
+    ``hub.wants`` themselves first.
+    """
+    await hub.publish(user.id, {"type": f"transactions.{kind}", **event})
+    await _publish_aggregates(db, user, dates, category_ids)
+
+
+async def _publish_aggregates(db: Session, user: User, dates, category_ids):
+    months = {(d.year, d.month) for d in dates if d is not None}
+    for year, month in sorted(months):
+        totals = monthly_totals(db, user.id, year, month, user.base_currency)
+        await hub.publish(user.id, {"type": "monthly_totals", **totals})
+
+    category_ids = [c for c in set(category_ids) if c is not None]
+    if category_ids:
+        progress = budget_progress(db, user.id, category_ids, base_currency=user.base_currency)
+        if progress:
+            await hub.publish(user.id, {"type": "budget_progress", "budgets": progress})
+
+
+async def publish_budget_change(db: Session, user: User, kind: str, payload: dict):
+    """Publish a budget delta, with fresh progress for created budgets"""
+    if not await hub.wants(user.id):
+        return
+
+    await hub.publish(user.id, {"type": f"budget.{kind}", "budget": payload})
+
+    if kind != "deleted" and payload.get("category_id"):
+        progress = budget_progress(db, user.id, [payload["category_id"]], base_currency=user.base_currency)
+        if progress:
+            await hub.publish(user.id, {"type": "budget_progress", "budgets": progress})
@@ -0,0 +1,37 @@
+"""Fast path for large list responses.
+
+Instead of loading ORM objects and validating each one through a Pydantic
+response model, list endpoints can select plain column tuples and hand them
+straight to orjson. A ``fields`` projection trims the SELECT to the columns
+the client actually renders.
+"""
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+
+
+def select_columns(columns: dict, fields: Optional[str]):
+    """Resolve a comma separated ``fields`` parameter against the allowed columns.
+
+    Returns ``(names, columns)`` in request order, or every allowed column when
+    ``fields`` is empty.
+    """
+    if not fields:
+        return list(columns), list(columns.values())
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown)}"
+        )
+    # Preserve order but drop duplicates
+    names = list(dict.fromkeys(names))
+    return names, [columns[name] for name in names]
+
+
+def rows_response(names, rows) -> ORJSONResponse:
+    """Serialize column tuples with orjson, skipping per-row model construction"""
+    return ORJSONResponse([dict(zip(names, row)) for row in rows])
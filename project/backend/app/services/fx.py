@@ -0,0 +1,170 @@
+"""Currency conversion backed by the local ``fx_rates`` table.
+
+Rates come from a CSV file (``date,currency,rate`` where ``rate`` is the
+value of one unit of ``currency`` in ``FX_PIVOT_CURRENCY``); nothing is
+fetched over the network. A transaction is converted at the latest rate on
+or before its date, so gaps (weekends, holidays, days since the last load)
+use the last known rate. Aggregates do the lookup inside SQL, while per-row
+conversions in list responses are served from an in-memory cache.
+
+Load or refresh rates with ``python -m app.services.fx rates.csv``.
+"""
+import bisect
+import csv
+from datetime import date, datetime
+import os
+import re
+import sys
+import threading
+import time
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import Session
+
+from ..database import FxRate, Transaction
+
+FX_RATES_FILE = os.getenv("FX_RATES_FILE")
+FX_PIVOT_CURRENCY = os.getenv("FX_PIVOT_CURRENCY", "USD")
+DEFAULT_CURRENCY = "USD"
+# Seconds before a worker re-reads rates, picking up CLI loads
+RATE_CACHE_TTL = int(os.getenv("FX_RATE_CACHE_TTL", 3600))
+
+_CURRENCY_CODE = re.compile(r"^[A-Z]{3}$")
+
+
+def normalize_currency(code: str):
+    """Upper-case a currency code, rejecting anything but three letters"""
+    if code is None:
+        return None
+    code = code.strip().upper()
+    if not _CURRENCY_CODE.match(code):
+        raise ValueError("currency must be a three-letter ISO 4217 code")
+    return code
+
+
+def read_rates_file(path: str) -> dict:
+    """Parse the rates CSV into ``{currency: {date: rate}}``"""
+    rates = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            currency = normalize_currency(row["currency"])
+            day = date.fromisoformat(row["date"].strip())
+            rates.setdefault(currency, {})[day] = float(row["rate"])
+    return rates
+
+
+def load_rates(db: Session, rates: dict) -> int:
+    """Replace the fx_rates table with ``rates``"""
+    days = [day for by_day in rates.values() for day in by_day]
+    if not days:
+        return 0
+
+    # The pivot is worth exactly 1 from the first day on, so conversions
+    # never need a special case
+    rates = dict(rates)
+    rates[FX_PIVOT_CURRENCY] = {min(days): 1.0}
+
+    rows = [
+        {"currency": currency, "date": day, "rate": rate}
+        for currency, by_day in rates.items()
+        for day, rate in by_day.items()
+    ]
+    db.query(FxRate).delete(synchronize_session=False)
+    db.bulk_insert_mappings(FxRate, rows)
+    db.commit()
+    rate_cache.clear()
+    return len(rows)
+
+
+def load_rates_file(db: Session, path: str = None) -> int:
+    path = path or FX_RATES_FILE
+    if not path or not os.path.exists(path):
+        return 0
+    return load_rates(db, read_rates_file(path))
+
+
+def _rate_on(currency, day):
+    """Scalar subquery for the latest rate of ``currency`` on or before ``day``"""
+    return select(FxRate.rate).where(
+        FxRate.currency == currency,
+        FxRate.date <= day,
+    ).order_by(FxRate.date.desc()).limit(1).correlate_except(FxRate).scalar_subquery()
+
+
+def converted_amount(base_currency: str):
+    """SQL expression for ``Transaction.amount`` in ``base_currency``.
+
+    Each rate is an index lookup on ``fx_rates``' primary key. Transactions
+    without a currency are assumed to be in the base currency, and amounts
+    whose rate is missing are left unconverted rather than dropped from the
+    total.
+
+    ``base_currency`` may also be a column expression (e.g. the owning user's
+    ``base_currency``) to convert rows for many users in one query.
+    """
+    if base_currency is None or isinstance(base_currency, str):
+        base_currency = base_currency or DEFAULT_CURRENCY
+    day = func.date(Transaction.date)
+
+    return case(
+        (or_(Transaction.currency.is_(None), Transaction.currency == base_currency), Transaction.amount),
+        else_=func.coalesce(
+            Transaction.amount * _rate_on(Transaction.currency, day) / _rate_on(base_currency, day),
+            Transaction.amount
+        ),
+    )
+
+
+class RateCache:
+    """Per-currency rates loaded lazily from fx_rates and kept for ``RATE_CACHE_TTL``"""
+
+    def __init__(self):
+        self._rates = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._rates = {}
+
+    def _rates_for(self, db: Session, currency: str):
+        cached = self._rates.get(currency)
+        if cached is None or time.monotonic() - cached[0] > RATE_CACHE_TTL:
+            rows = db.query(FxRate.date, FxRate.rate).filter(
+                FxRate.currency == currency
+            ).order_by(FxRate.date).all()
+            cached = (time.monotonic(), [row.date for row in rows], [row.rate for row in rows])
+            with self._lock:
+                self._rates[currency] = cached
+        return cached[1], cached[2]
+
+    def rate_on(self, db: Session, currency: str, day: date):
+        """Latest rate of ``currency`` on or before ``day``, or None"""
+        days, rates = self._rates_for(db, currency)
+        index = bisect.bisect_right(days, day)
+        return rates[index - 1] if index else None
+
+    def convert(self, db: Session, amount: float, currency: str, base_currency: str, when) -> float:
+        """Convert one amount, matching ``converted_amount`` in SQL"""
+        base_currency = base_currency or DEFAULT_CURRENCY
+        if amount is None or not currency or currency == base_currency:
+            return amount
+        day = when.date() if isinstance(when, datetime) else when
+        rate = self.rate_on(db, currency, day)
+        base_rate = self.rate_on(db, base_currency, day)
+        if rate is None or not base_rate:
+            return amount
+        return amount * rate / base_rate
+
+
+rate_cache = RateCache()
+
+
+if __name__ == "__main__":
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = load_rates_file(db, sys.argv[1] if len(sys.argv) > 1 else None)
+    finally:
+        db.close()
+    print(f"Loaded {count} fx rates")
@@ -0,0 +1,202 @@
+"""Admission control for expensive endpoints.
+
+``rate_limit(cost)`` charges weighted token buckets keyed by client IP and,
+when the request carries a valid bearer token, by user. ``heavy_query`` caps
+how many heavy analytics queries each worker runs at once; the endpoints it
+guards are plain ``def`` handlers so their blocking queries run in the
+threadpool while the slot is held. Both reject with ``Retry-After`` so a
+single noisy client can't starve everyone else's requests.
+
+Buckets live in memory by default; set ``RATE_LIMIT_REDIS_URL`` (or
+``REDIS_URL``) to share them across workers. If Redis is unreachable the
+limiter fails open to in-process buckets rather than failing requests.
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL"))
+
+# (capacity, refill tokens per second)
+USER_BUCKET = (
+    float(os.getenv("RATE_LIMIT_USER_CAPACITY", 60)),
+    float(os.getenv("RATE_LIMIT_USER_RATE", 1)),
+)
+IP_BUCKET = (
+    float(os.getenv("RATE_LIMIT_IP_CAPACITY", 120)),
+    float(os.getenv("RATE_LIMIT_IP_RATE", 2)),
+)
+MAX_HEAVY_QUERIES = int(os.getenv("MAX_HEAVY_QUERIES", 4))
+# Seconds to wait on Redis before falling back to in-process buckets
+REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", 0.5))
+# Seconds to skip Redis after a failure, so requests don't each wait out
+# the timeout while it is down
+REDIS_RETRY_INTERVAL = float(os.getenv("RATE_LIMIT_REDIS_RETRY_INTERVAL", 5))
+# Seconds between sweeps of in-process buckets that have refilled
+PRUNE_INTERVAL = 60
+
+
+class MemoryBackend:
+    """Token buckets held in this process.
+
+    A full bucket is the same as no bucket, so buckets are dropped once they
+    have refilled and memory stays proportional to recently active clients.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated, full_at)
+        self._lock = threading.Lock()
+        self._pruned = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _prune(self, now: float):
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._pruned = now
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned >= PRUNE_INTERVAL:
+                self._prune(now)
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return (True, 0.0) if allowed else (False, (cost - tokens) / rate)
+
+
+_REDIS_TAKE = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBackend:
+    """Token buckets shared by every worker through an atomic Redis script"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+        self._take = self._redis.register_script(_REDIS_TAKE)
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float):
+        allowed, retry = await self._take(
+            keys=[f"finance-tracker:ratelimit:{key}"],
+            args=[capacity, rate, cost, time.time()],
+        )
+        return bool(int(allowed)), float(retry)
+
+
+backend = RedisBackend(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else MemoryBackend()
+# Used while the shared backend is failing
+fallback_backend = MemoryBackend()
+# monotonic() time before which the shared backend is skipped
+_backend_down_until = 0.0
+
+
+async def _take(key: str, capacity: float, rate: float, cost: float):
+    global _backend_down_until
+    if time.monotonic() >= _backend_down_until:
+        try:
+            return await backend.take(key, capacity, rate, cost)
+        except Exception:
+            logger.warning(
+                "Rate limit backend unavailable, using in-process buckets for %ss",
+                REDIS_RETRY_INTERVAL, exc_info=True
+            )
+            _backend_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+    return await fallback_backend.take(key, capacity, rate, cost)
+
+
+def _user_key(request: Request):
+    """User id claim from the bearer token, without a database round trip"""
+    # Imported here because the auth router itself depends on this module
+    from ..routers.auth import SECRET_KEY, ALGORITHM
+
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+def _too_many_requests(retry_after: float):
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(cost: float = 1):
+    """Dependency charging ``cost`` tokens to the caller's IP and user buckets"""
+
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+
+        buckets = []
+        if request.client:
+            buckets.append((f"ip:{request.client.host}", IP_BUCKET))
+        user = _user_key(request)
+        if user:
+            buckets.append((f"user:{user}", USER_BUCKET))
+
+        for key, (capacity, rate) in buckets:
+            allowed, retry_after = await _take(key, capacity, rate, min(cost, capacity))
+            if not allowed:
+                raise _too_many_requests(retry_after)
+
+    return dependency
+
+
+_heavy_slots = asyncio.Semaphore(MAX_HEAVY_QUERIES)
+
+
+async def heavy_query():
+    """Dependency holding one of this worker's ``MAX_HEAVY_QUERIES`` slots for the request"""
+    if _heavy_slots.locked():
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    await _heavy_slots.acquire()
+    try:
+        yield
+    finally:
+        _heavy_slots.release()
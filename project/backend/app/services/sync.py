@@ -0,0 +1,115 @@
+"""Per-user change versions for delta sync.
+
+Every write to a user's transactions, categories or budgets stamps the rows
+with a version taken from ``User.change_version``, and deletes leave a
+``SyncTombstone``. ``GET /api/sync?since=<version>`` can then return only
+what changed. ORM writes are stamped automatically in ``before_flush``;
+set-based UPDATE/DELETE statements bypass the flush and must use
+``next_version`` / ``record_deletions`` themselves.
+
+System categories are shared rows with no per-user version. Hiding one
+behind a user's customised copy, or showing it again when the copy is
+deleted, is recorded with ``record_system_category_change``.
+
+Archiving moves rows out of the online table without tombstones, since the
+data still exists; clients keep their copies of archived years.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, insert, literal, select
+from sqlalchemy.orm import Session
+
+from ..database import Budget, Category, SyncTombstone, Transaction, User
+
+SYNCED_ENTITIES = {
+    Transaction: "transaction",
+    Category: "category",
+    Budget: "budget",
+}
+SYSTEM_CATEGORY = "system_category"
+
+
+def reserve_versions(db: Session, user_id: str, count: int = 1) -> int:
+    """Reserve ``count`` consecutive versions for a user and return the first.
+
+    Runs on the session's connection directly so it is safe inside a flush,
+    and the row lock it takes serializes concurrent writers for the user.
+    """
+    users = User.__table__
+    connection = db.connection()
+    connection.execute(
+        users.update().where(users.c.id == user_id).values(
+            change_version=users.c.change_version + count
+        )
+    )
+    last = connection.execute(
+        select(users.c.change_version).where(users.c.id == user_id)
+    ).scalar()
+    return last - count + 1
+
+
+def next_version(db: Session, user_id: str) -> int:
+    return reserve_versions(db, user_id, 1)
+
+
+def record_deletions(db: Session, user_id: str, model, query, version: int = None) -> int:
+    """Write tombstones for every row ``query`` selects, before it is bulk deleted"""
+    version = version or next_version(db, user_id)
+    rows = query.with_entities(
+        literal(SYNCED_ENTITIES[model]),
+        model.id,
+        model.user_id,
+        literal(version),
+        literal(datetime.utcnow()),
+    )
+    db.execute(
+        insert(SyncTombstone).from_select(
+            ["entity", "entity_id", "user_id", "version", "deleted_at"],
+            rows.statement,
+        )
+    )
+    return version
+
+
+def record_system_category_change(db: Session, user_id: str, system_category_id: str, version: int):
+    """Note that a system category was hidden from or shown again to a user"""
+    db.merge(SyncTombstone(
+        entity=SYSTEM_CATEGORY,
+        entity_id=system_category_id,
+        user_id=user_id,
+        version=version,
+        deleted_at=datetime.utcnow(),
+    ))
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_versions(session, flush_context, instances):
+    changed = defaultdict(list)
+    deleted = defaultdict(list)
+
+    for obj in session.new:
+        if type(obj) in SYNCED_ENTITIES and obj.user_id:
+            changed[obj.user_id].append(obj)
+    for obj in session.dirty:
+        if type(obj) in SYNCED_ENTITIES and obj.user_id and session.is_modified(obj, include_collections=False):
+            changed[obj.user_id].append(obj)
+    for obj in session.deleted:
+        if type(obj) in SYNCED_ENTITIES and obj.user_id:
+            deleted[obj.user_id].append(obj)
+
+    for user_id in set(changed) | set(deleted):
+        objs = changed[user_id]
+        version = reserve_versions(session, user_id, len(objs) + len(deleted[user_id]))
+        for obj in objs:
+            obj.version = version
+            version += 1
+        for obj in deleted[user_id]:
+            session.add(SyncTombstone(
+                entity=SYNCED_ENTITIES[type(obj)],
+                entity_id=obj.id,
+                user_id=user_id,
+                version=version,
+                deleted_at=datetime.utcnow(),
+            ))
+            version += 1
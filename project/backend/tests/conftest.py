@@ -0,0 +1,200 @@
+"""Shared fixtures: a seeded database, the test client, users and a SQL recorder.
+
+The query-plan tests run against the seeded users; behavioural tests
+register a fresh user with ``new_user`` so they start from empty data.
+The app binds its engine at import time, so the environment is configured
+before ``app`` is imported. Tests run against a throwaway SQLite file by
+default; set ``TEST_DATABASE_URL`` to a local Postgres database to run the
+same checks there (its tables are dropped and recreated).
+"""
+from datetime import datetime, timedelta, date
+import os
+import random
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="finance-tracker-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_tmp}/query_plans.db")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["CATEGORIZER_MODEL_DIR"] = os.path.join(_tmp, "models")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+os.environ.pop("REDIS_URL", None)
+os.environ.pop("FX_RATES_FILE", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, text  # noqa: E402
+
+from app.database import Base, Budget, Category, FxRate, Transaction, User, engine  # noqa: E402
+
+# Size of the seeded dataset; large enough that a full scan is never the
+# cheapest plan for a single user's query
+SEED_USERS = int(os.getenv("QUERY_PLAN_SEED_USERS", 50))
+SEED_ROWS_PER_USER = int(os.getenv("QUERY_PLAN_ROWS_PER_USER", 2000))
+SEED_CATEGORIES_PER_USER = 5
+SEED_BUDGETS_PER_USER = 3
+INSERT_CHUNK_SIZE = 5000
+
+
+class QueryRecorder:
+    """Collects every statement the engine sends while ``recording`` is on"""
+
+    def __init__(self):
+        self.recording = False
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.recording:
+            self.statements.append((statement, parameters))
+
+    def start(self):
+        self.statements = []
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+        return list(self.statements)
+
+
+def _insert(conn, model, rows):
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        conn.execute(model.__table__.insert(), rows[i:i + INSERT_CHUNK_SIZE])
+
+
+def _seed(conn):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    users, categories, transactions, budgets = [], [], [], []
+
+    for u in range(SEED_USERS):
+        user_id = str(uuid.uuid4())
+        users.append({
+            "id": user_id,
+            "email": f"user{u}@example.com",
+            "username": f"user{u}",
+            "hashed_password": "not-a-real-hash",
+            "full_name": f"User {u}",
+            "base_currency": "USD",
+            "change_version": SEED_ROWS_PER_USER,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        })
+        category_ids = []
+        for c in range(SEED_CATEGORIES_PER_USER):
+            category_ids.append(str(uuid.uuid4()))
+            categories.append({
+                "id": category_ids[-1],
+                "name": f"Category {c}",
+                "type": "expense",
+                "color": "#3B82F6",
+                "icon": "💰",
+                "user_id": user_id,
+                "version": c + 1,
+                "created_at": now,
+            })
+        for t in range(SEED_ROWS_PER_USER):
+            when = now - timedelta(days=rng.randint(0, 3 * 365), seconds=rng.randint(0, 86400))
+            transactions.append({
+                "id": str(uuid.uuid4()),
+                "amount": round(rng.uniform(1, 500), 2),
+                "currency": "EUR" if t % 10 == 0 else "USD",
+                "description": rng.choice(["AMAZON", "STARBUCKS", "SHELL", "PAYROLL", "RENT"]) + f" {t}",
+                "type": "income" if t % 7 == 0 else "expense",
+                "date": when,
+                "user_id": user_id,
+                "category_id": rng.choice(category_ids),
+                "account_id": None,
+                "version": t + 1,
+                "created_at": when,
+                "updated_at": when,
+            })
+        for b in range(SEED_BUDGETS_PER_USER):
+            budgets.append({
+                "id": str(uuid.uuid4()),
+                "name": f"Budget {b}",
+                "amount": 1000.0,
+                "spent": 0.0,
+                "period": ["weekly", "monthly", "yearly"][b % 3],
+                "category_id": category_ids[b],
+                "user_id": user_id,
+                "version": b + 1,
+                "created_at": now,
+                "updated_at": now,
+            })
+
+    today = date.today()
+    rates = [
+        {"currency": currency, "date": today - timedelta(days=d), "rate": rate}
+        for currency, rate in (("USD", 1.0), ("EUR", 1.1))
+        for d in range(3 * 365 + 2)
+    ]
+
+    _insert(conn, User, users)
+    _insert(conn, Category, categories)
+    _insert(conn, Transaction, transactions)
+    _insert(conn, Budget, budgets)
+    _insert(conn, FxRate, rates)
+    return users
+
+
+@pytest.fixture(scope="session")
+def seeded_users():
+    from app.main import prepare_database
+
+    if engine.dialect.name != "sqlite":
+        Base.metadata.drop_all(bind=engine)
+    prepare_database()
+
+    with engine.begin() as conn:
+        users = _seed(conn)
+        # Give the planner real statistics, as production has
+        conn.execute(text("ANALYZE"))
+    return users
+
+
+@pytest.fixture(scope="session")
+def seed_rows_per_user():
+    return SEED_ROWS_PER_USER
+
+
+@pytest.fixture(scope="session")
+def client(seeded_users):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(seeded_users):
+    from app.routers.auth import create_access_token
+
+    token = create_access_token({"sub": seeded_users[0]["email"]})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def new_user(client):
+    """Register a fresh user with no data and return their auth headers"""
+    name = f"test-{uuid.uuid4().hex[:12]}"
+    response = client.post("/api/auth/register", json={
+        "email": f"{name}@example.com",
+        "username": name,
+        "password": "correct horse battery staple",
+        "full_name": "Test User",
+    })
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def query_recorder():
+    recorder = QueryRecorder()
+    event.listen(engine, "before_cursor_execute", recorder)
+    yield recorder
+    event.remove(engine, "before_cursor_execute", recorder)
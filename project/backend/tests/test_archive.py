@@ -0,0 +1,112 @@
+"""Behavioural regression tests for archived transactions."""
+from datetime import datetime
+
+import pytest
+
+from app.database import SessionLocal, Transaction
+from app.services import archive
+
+
+def _create(client, headers, when):
+    response = client.post("/api/transactions/", headers=headers, json={
+        "amount": 5.0, "description": "SHELL", "type": "expense", "date": when.isoformat(),
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def archived_user(client, new_user):
+    """A user with one archived transaction in each of two old years and three online ones"""
+    this_year = datetime.utcnow().year
+    old = [_create(client, new_user, datetime(this_year - year, 3, 1)) for year in (5, 4)]
+    for month in (1, 2, 3):
+        _create(client, new_user, datetime(this_year, month, 2))
+
+    db = SessionLocal()
+    try:
+        user_id = db.query(Transaction.user_id).filter(Transaction.id == old[0]["id"]).scalar()
+        for year in (5, 4):
+            assert archive.archive_year(db, user_id, this_year - year) == 1
+    finally:
+        db.close()
+    return new_user, user_id
+
+
+@pytest.fixture
+def file_reads(monkeypatch):
+    reads = []
+    read_file = archive._read_file
+
+    def counting(path, filters=None):
+        reads.append(path)
+        return read_file(path, filters)
+
+    monkeypatch.setattr(archive, "_read_file", counting)
+    return reads
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_full_online_page_skips_the_archive(client, archived_user, file_reads, fast):
+    headers, _ = archived_user
+
+    response = client.get(f"/api/transactions/?limit=2&fast={str(fast).lower()}", headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 2
+    assert file_reads == []
+
+
+@pytest.mark.parametrize("query", ["", "&fast=true", "&fields=date,base_amount"])
+def test_short_online_page_merges_the_archive(client, archived_user, file_reads, query):
+    headers, _ = archived_user
+
+    response = client.get(f"/api/transactions/?limit=10{query}", headers=headers)
+
+    assert response.status_code == 200, response.text
+    dates = [row["date"] for row in response.json()]
+    assert len(dates) == 5
+    assert dates == sorted(dates, reverse=True)
+    assert [row["base_amount"] for row in response.json()] == [5.0] * 5
+    assert len(file_reads) == 2
+
+
+def test_read_transactions_stops_at_the_limit(archived_user, file_reads):
+    _, user_id = archived_user
+    db = SessionLocal()
+    try:
+        rows = archive.read_transactions(db, user_id, limit=1)
+    finally:
+        db.close()
+
+    assert [row["date"].year for row in rows] == [datetime.utcnow().year - 4]
+    assert len(file_reads) == 1
+
+
+def test_deleting_a_category_moves_its_archived_transactions(client, new_user):
+    def category(name):
+        response = client.post("/api/categories/", headers=new_user, json={"name": name, "type": "expense"})
+        return response.json()["id"]
+
+    old_category, new_category = category("Fuel"), category("Car")
+    year = datetime.utcnow().year - 5
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 40.0, "type": "expense", "category_id": old_category, "date": datetime(year, 3, 1).isoformat(),
+    })
+    transaction = response.json()
+    db = SessionLocal()
+    try:
+        user_id = db.query(Transaction.user_id).filter(Transaction.id == transaction["id"]).scalar()
+        assert archive.archive_year(db, user_id, year) == 1
+    finally:
+        db.close()
+
+    response = client.delete(f"/api/categories/{old_category}?reassign_to={new_category}", headers=new_user)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["transactions_moved"] == 1
+    listed = client.get("/api/transactions/", headers=new_user).json()
+    assert [t["category_id"] for t in listed] == [new_category]
+    stats = client.get("/api/categories/?with_stats=true", headers=new_user).json()
+    car = next(c for c in stats if c["id"] == new_category)
+    assert (car["transaction_count"], car["total_amount"]) == (1, pytest.approx(40.0))
@@ -0,0 +1,101 @@
+"""Behavioural regression tests for the batch budget alert job."""
+from datetime import datetime
+
+import pytest
+
+from app.database import SessionLocal
+from app.services.budget_alerts import evaluate_budgets
+
+YEAR = datetime.utcnow().year - 1
+
+
+def _post(client, headers, path, body):
+    response = client.post(path, headers=headers, json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def budget(client, new_user):
+    """A monthly budget of 100 on a fresh expense category"""
+    category = _post(client, new_user, "/api/categories/", {"name": "Groceries", "type": "expense"})
+    _post(client, new_user, "/api/budgets/", {
+        "name": "Groceries", "amount": 100.0, "period": "monthly", "category_id": category["id"],
+    })
+    return new_user, category["id"]
+
+
+def _spend(client, headers, category_id, amount, day, month=6, currency=None):
+    body = {
+        "amount": amount, "type": "expense", "category_id": category_id,
+        "date": datetime(YEAR, month, day).isoformat(),
+    }
+    if currency:
+        body["currency"] = currency
+    _post(client, headers, "/api/transactions/", body)
+
+
+def _evaluate(month=6, day=28):
+    db = SessionLocal()
+    try:
+        evaluate_budgets(db, now=datetime(YEAR, month, day))
+    finally:
+        db.close()
+
+
+def _alerts(client, headers):
+    response = client.get("/api/budgets/alerts", headers=headers)
+    assert response.status_code == 200, response.text
+    return sorted((a["period_start"][:10], a["threshold"], round(a["spent"], 2)) for a in response.json())
+
+
+def test_alerts_at_eighty_and_one_hundred_percent(client, budget):
+    headers, category_id = budget
+    _spend(client, headers, category_id, 70.0, day=2)
+    _evaluate()
+    assert _alerts(client, headers) == []
+
+    _spend(client, headers, category_id, 15.0, day=3)
+    _evaluate()
+    assert _alerts(client, headers) == [(f"{YEAR}-06-01", 80, 85.0)]
+
+    _spend(client, headers, category_id, 20.0, day=4)
+    _evaluate()
+    assert _alerts(client, headers) == [(f"{YEAR}-06-01", 80, 85.0), (f"{YEAR}-06-01", 100, 105.0)]
+
+
+def test_rerunning_in_the_same_period_raises_nothing_new(client, budget):
+    headers, category_id = budget
+    _spend(client, headers, category_id, 120.0, day=2)
+    _evaluate()
+    first = _alerts(client, headers)
+
+    _spend(client, headers, category_id, 5.0, day=3)
+    _evaluate()
+    _evaluate(day=30)
+
+    assert first == [(f"{YEAR}-06-01", 80, 120.0), (f"{YEAR}-06-01", 100, 120.0)]
+    assert _alerts(client, headers) == first
+
+
+def test_next_period_raises_alerts_again(client, budget):
+    headers, category_id = budget
+    _spend(client, headers, category_id, 90.0, day=2)
+    _evaluate()
+
+    # June's spend doesn't count towards July
+    _evaluate(month=7, day=5)
+    assert _alerts(client, headers) == [(f"{YEAR}-06-01", 80, 90.0)]
+
+    _spend(client, headers, category_id, 81.0, day=6, month=7)
+    _evaluate(month=7, day=7)
+    assert _alerts(client, headers) == [(f"{YEAR}-06-01", 80, 90.0), (f"{YEAR}-07-01", 80, 81.0)]
+
+
+def test_spend_is_converted_to_the_base_currency(client, budget):
+    headers, category_id = budget
+    # 1 EUR is 1.1 USD in the seeded rates, so 75 EUR is 82.50 USD
+    _spend(client, headers, category_id, 75.0, day=2, currency="EUR")
+    _evaluate()
+
+    assert _alerts(client, headers) == [(f"{YEAR}-06-01", 80, 82.5)]
@@ -0,0 +1,46 @@
+"""Behavioural regression tests for the category endpoints."""
+
+
+def _post(client, headers, path, body):
+    response = client.post(path, headers=headers, json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _category(client, headers, type="expense"):
+    return _post(client, headers, "/api/categories/", {"name": f"Test {type}", "type": type})
+
+
+def _system_category(client, headers, name, type):
+    categories = client.get("/api/categories/", headers=headers).json()
+    return next(c for c in categories if c["name"] == name and c["type"] == type and c["is_system"])
+
+
+def test_budgets_survive_deleting_their_category(client, new_user):
+    category = _category(client, new_user)
+    budget = _post(client, new_user, "/api/budgets/", {
+        "name": "Groceries", "amount": 300.0, "category_id": category["id"],
+    })
+
+    deleted = client.delete(f"/api/categories/{category['id']}", headers=new_user)
+    budgets = client.get("/api/budgets/", headers=new_user)
+
+    assert deleted.status_code == 200, deleted.text
+    assert budgets.status_code == 200, budgets.text
+    assert [(b["id"], b["category_id"]) for b in budgets.json()] == [(budget["id"], None)]
+
+
+def test_reassign_requires_matching_type(client, new_user):
+    category = _category(client, new_user, "expense")
+    transaction = _post(client, new_user, "/api/transactions/", {
+        "amount": 9.0, "type": "expense", "category_id": category["id"],
+    })
+    salary = _system_category(client, new_user, "Salary", "income")
+
+    response = client.delete(
+        f"/api/categories/{category['id']}?reassign_to={salary['id']}", headers=new_user
+    )
+    unchanged = client.get(f"/api/transactions/{transaction['id']}", headers=new_user).json()
+
+    assert response.status_code == 400
+    assert unchanged["category_id"] == category["id"]
@@ -0,0 +1,59 @@
+"""Behavioural regression tests for batch auto-categorization."""
+from app.services import categorizer
+
+
+def _category(client, headers, name):
+    response = client.post("/api/categories/", headers=headers, json={"name": name, "type": "expense"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def _add(client, headers, description, category_id=None, count=1):
+    for i in range(count):
+        body = {"amount": 9.99, "description": f"{description} {i}", "type": "expense"}
+        if category_id:
+            body["category_id"] = category_id
+        response = client.post("/api/transactions/", headers=headers, json=body)
+        assert response.status_code == 200, response.text
+
+
+def _auto_categorize(client, headers):
+    response = client.post("/api/transactions/auto-categorize", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["categorized"]
+
+
+def _categories_by_description(client, headers):
+    response = client.get("/api/transactions/?limit=1000", headers=headers)
+    assert response.status_code == 200, response.text
+    return {t["description"]: t["category_id"] for t in response.json()}
+
+
+def test_predictions_are_not_training_labels_and_new_labels_are_learned(client, new_user):
+    coffee = _category(client, new_user, "Coffee")
+    fuel = _category(client, new_user, "Fuel")
+    streaming = _category(client, new_user, "Streaming")
+    _add(client, new_user, "STARBUCKS", coffee, count=15)
+    _add(client, new_user, "SHELL STATION", fuel, count=15)
+    _add(client, new_user, "STARBUCKS COFFEE")
+
+    assert _auto_categorize(client, new_user) == 1
+    assert _categories_by_description(client, new_user)["STARBUCKS COFFEE 0"] == coffee
+
+    # Fewer new labels than RETRAIN_THRESHOLD, then another batch prediction
+    first = categorizer.RETRAIN_THRESHOLD - 20
+    _add(client, new_user, "NETFLIX", streaming, count=first)
+    _add(client, new_user, "STARBUCKS LATTE")
+    assert _auto_categorize(client, new_user) == 1
+
+    # The labels from before that prediction still count towards a retrain
+    _add(client, new_user, "NETFLIX.COM", streaming, count=20)
+    _add(client, new_user, "NETFLIX monthly")
+    _auto_categorize(client, new_user)
+
+    categories = _categories_by_description(client, new_user)
+    assert categories["NETFLIX monthly 0"] == streaming
+    # The earlier predictions were never fed back in as labels
+    user_id = client.get("/api/auth/me", headers=new_user).json()["id"]
+    model = categorizer._cache[user_id]
+    assert model.sample_count == 30 + first + 20
@@ -0,0 +1,77 @@
+"""Behavioural regression tests for the live update hub."""
+import asyncio
+import socket
+import time
+
+import pytest
+
+from app.services import events
+
+# Nothing listens on port 1, so every connection attempt is refused
+UNREACHABLE_REDIS_URL = "redis://127.0.0.1:1/0"
+
+
+@pytest.fixture
+def unreachable_redis_hub(monkeypatch):
+    hub = events.EventHub(events.RedisBroker(UNREACHABLE_REDIS_URL))
+    monkeypatch.setattr(events, "hub", hub)
+    return hub
+
+
+def test_writes_succeed_when_redis_is_down(client, new_user, unreachable_redis_hub):
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 12.0,
+        "description": "SHELL",
+        "type": "expense",
+    })
+
+    assert response.status_code == 200, response.text
+
+
+@pytest.fixture
+def silent_redis_hub(monkeypatch):
+    """A hub whose Redis accepts connections but never answers, like a partition"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)  # connections queue in the backlog and are never read
+    hub = events.EventHub(events.RedisBroker(f"redis://127.0.0.1:{server.getsockname()[1]}/0"))
+    monkeypatch.setattr(events, "hub", hub)
+    yield hub
+    server.close()
+
+
+def test_writes_do_not_hang_when_redis_stops_answering(client, new_user, silent_redis_hub):
+    started = time.monotonic()
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 12.0,
+        "description": "SHELL",
+        "type": "expense",
+    })
+
+    assert response.status_code == 200, response.text
+    assert time.monotonic() - started < 5 * events.REDIS_TIMEOUT
+
+
+def test_hub_is_best_effort_when_redis_is_down(unreachable_redis_hub):
+    async def exercise():
+        wants = await unreachable_redis_hub.wants("someone")
+        await unreachable_redis_hub.publish("someone", {"type": "ping"})
+        return wants
+
+    assert asyncio.run(exercise()) is False
+
+
+def test_local_broker_only_wants_subscribed_users():
+    hub = events.EventHub(events.LocalBroker())
+
+    async def exercise():
+        queue = await hub.subscribe("listening")
+        await hub.publish("listening", {"type": "ping"})
+        wanted = (await hub.wants("listening"), await hub.wants("idle"))
+        hub.unsubscribe("listening", queue)
+        return wanted, queue.get_nowait(), await hub.wants("listening")
+
+    wanted, event, after = asyncio.run(exercise())
+    assert wanted == (True, False)
+    assert event == {"type": "ping"}
+    assert after is False
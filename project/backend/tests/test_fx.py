@@ -0,0 +1,95 @@
+"""Behavioural regression tests for multi-currency support."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import Account, SessionLocal
+
+
+def _listed(client, headers):
+    response = client.get("/api/transactions/", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _me(client, headers):
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_base_currency_can_be_set(client, new_user):
+    response = client.put("/api/auth/me", headers=new_user, json={"base_currency": "eur"})
+
+    assert response.status_code == 200, response.text
+    assert _me(client, new_user)["base_currency"] == "EUR"
+
+
+@pytest.mark.parametrize("currency", ["EURO", "E1", "", "12$"])
+def test_invalid_currency_codes_are_rejected(client, new_user, currency):
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 1.0, "type": "expense", "currency": currency,
+    })
+    assert response.status_code == 422
+
+    response = client.put("/api/auth/me", headers=new_user, json={"base_currency": currency})
+    assert response.status_code == 422
+
+
+def test_currency_codes_are_upper_cased(client, new_user):
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 20.0, "type": "expense", "currency": "eur",
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["currency"] == "EUR"
+    assert _listed(client, new_user)[0]["base_amount"] == pytest.approx(22.0)
+
+
+def test_transactions_take_the_account_currency(client, new_user):
+    db = SessionLocal()
+    try:
+        account = Account(name="Travel card", type="credit", currency="EUR", user_id=_me(client, new_user)["id"])
+        db.add(account)
+        db.commit()
+        account_id = account.id
+    finally:
+        db.close()
+
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 10.0, "type": "expense", "account_id": account_id,
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["currency"] == "EUR"
+
+
+def test_dates_after_the_last_rate_use_the_latest_rate(client, new_user):
+    tomorrow = datetime.utcnow() + timedelta(days=1)
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 20.0, "type": "expense", "currency": "EUR", "date": tomorrow.isoformat(),
+    })
+    assert response.status_code == 200, response.text
+    assert _listed(client, new_user)[0]["base_amount"] == pytest.approx(22.0)
+
+    summary = client.get(
+        f"/api/transactions/summary/monthly?year={tomorrow.year}&month={tomorrow.month}",
+        headers=new_user,
+    ).json()
+    assert summary["total_expenses"] == pytest.approx(22.0)
+
+
+def test_fast_path_returns_the_same_fields_and_base_amount(client, new_user):
+    client.post("/api/transactions/", headers=new_user, json={
+        "amount": 20.0, "type": "expense", "currency": "EUR", "description": "LOUVRE",
+    })
+
+    regular = _listed(client, new_user)
+    fast = client.get("/api/transactions/?fast=true", headers=new_user)
+    projected = client.get("/api/transactions/?fields=base_amount,id", headers=new_user)
+
+    assert fast.status_code == 200, fast.text
+    assert projected.status_code == 200, projected.text
+    assert set(fast.json()[0]) == set(regular[0])
+    assert fast.json()[0]["base_amount"] == pytest.approx(22.0)
+    assert projected.json() == [{"base_amount": pytest.approx(22.0), "id": regular[0]["id"]}]
@@ -0,0 +1,93 @@
+"""Behavioural regression tests for upgrading databases from older releases."""
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import migrations
+from app.routers.categories import DEFAULT_CATEGORIES, system_category_id
+
+# Schema of the tables as releases before shared system categories created them
+OLD_SCHEMA = [
+    """CREATE TABLE users (
+        id VARCHAR PRIMARY KEY, email VARCHAR NOT NULL, username VARCHAR NOT NULL,
+        hashed_password VARCHAR NOT NULL, full_name VARCHAR, is_active BOOLEAN,
+        created_at DATETIME, updated_at DATETIME)""",
+    """CREATE TABLE categories (
+        id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, type VARCHAR NOT NULL, color VARCHAR,
+        icon VARCHAR, user_id VARCHAR NOT NULL REFERENCES users (id), created_at DATETIME)""",
+    """CREATE TABLE accounts (
+        id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, type VARCHAR NOT NULL, balance FLOAT,
+        user_id VARCHAR NOT NULL REFERENCES users (id), created_at DATETIME, updated_at DATETIME)""",
+    """CREATE TABLE transactions (
+        id VARCHAR PRIMARY KEY, amount FLOAT NOT NULL, description VARCHAR, type VARCHAR NOT NULL,
+        date DATETIME, user_id VARCHAR NOT NULL REFERENCES users (id),
+        category_id VARCHAR REFERENCES categories (id), account_id VARCHAR REFERENCES accounts (id),
+        created_at DATETIME, updated_at DATETIME)""",
+    """CREATE TABLE budgets (
+        id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, amount FLOAT NOT NULL, spent FLOAT,
+        period VARCHAR, category_id VARCHAR REFERENCES categories (id),
+        user_id VARCHAR NOT NULL REFERENCES users (id), created_at DATETIME, updated_at DATETIME)""",
+]
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'old.db')}")
+    with engine.begin() as conn:
+        for ddl in OLD_SCHEMA:
+            conn.execute(text(ddl))
+        for user_id in ("u1", "u2"):
+            conn.execute(text("INSERT INTO users (id, email, username, hashed_password) "
+                              "VALUES (:id, :id, :id, 'x')"), {"id": user_id})
+            # What the old setup-defaults endpoint created for every user
+            for type, defaults in DEFAULT_CATEGORIES.items():
+                for cat_data in defaults:
+                    conn.execute(text(
+                        "INSERT INTO categories (id, name, type, color, icon, user_id) "
+                        "VALUES (:id, :name, :type, :color, :icon, :user_id)"
+                    ), {"id": f"{user_id}-{type}-{cat_data['name']}", "type": type, "user_id": user_id, **cat_data})
+        conn.execute(text("UPDATE categories SET color = '#000000' WHERE id = 'u1-expense-Travel'"))
+        conn.execute(text("INSERT INTO categories (id, name, type, user_id) VALUES ('pets', 'Pets', 'expense', 'u1')"))
+        for category in ("u1-expense-Food & Dining", "u1-expense-Travel", "pets"):
+            conn.execute(text("INSERT INTO transactions (id, amount, type, user_id, category_id) "
+                              "VALUES (:id, 1, 'expense', 'u1', :id)"), {"id": category})
+        conn.execute(text("INSERT INTO budgets (id, name, amount, user_id, category_id) "
+                          "VALUES ('b1', 'Food', 100, 'u1', 'u1-expense-Food & Dining')"))
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_folds_default_copies_into_system_categories(old_engine):
+    migrations.upgrade(old_engine)
+
+    food = system_category_id("expense", "Food & Dining")
+    with old_engine.connect() as conn:
+        categories = conn.execute(text("SELECT id, user_id, system_category_id FROM categories")).fetchall()
+        transactions = dict(conn.execute(text("SELECT id, category_id FROM transactions")).fetchall())
+        budget_category = conn.execute(text("SELECT category_id FROM budgets")).scalar()
+
+    defaults = sum(DEFAULT_CATEGORIES.values(), [])
+    user_categories = {row.id: row.system_category_id for row in categories if row.user_id}
+    assert sum(1 for row in categories if row.user_id is None) == len(defaults)
+    # Only the customised copy and the user's own category remain
+    assert user_categories == {"u1-expense-Travel": system_category_id("expense", "Travel"), "pets": None}
+    assert transactions == {
+        "u1-expense-Food & Dining": food,
+        "u1-expense-Travel": "u1-expense-Travel",
+        "pets": "pets",
+    }
+    assert budget_category == food
+
+
+def test_upgrade_is_repeatable(old_engine):
+    migrations.upgrade(old_engine)
+    with old_engine.connect() as conn:
+        before = conn.execute(text("SELECT COUNT(*) FROM categories")).scalar()
+
+    migrations.upgrade(old_engine)
+
+    with old_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM categories")).scalar() == before
+        # user_id is nullable now, as shared system categories need
+        conn.execute(text("INSERT INTO categories (id, name, type) VALUES ('shared', 'Shared', 'expense')"))
@@ -0,0 +1,297 @@
+"""Query-plan regression tests.
+
+Every endpoint below is called against the seeded dataset while its SQL is
+recorded. The tests then assert that
+
+* the number of statements stays within a fixed budget, independent of how
+  many rows the user has, which catches new N+1 patterns, and
+* no statement plans a full scan of a large table, using ``EXPLAIN QUERY
+  PLAN`` on SQLite and ``EXPLAIN (FORMAT JSON)`` on Postgres, where the
+  planner's row estimates are also bounded.
+
+SQLite does not expose row estimates, so the row bound only applies on
+Postgres (``TEST_DATABASE_URL``).
+"""
+import asyncio
+import json
+import re
+
+import pytest
+
+from app.database import Budget, Category, SessionLocal, Transaction, engine
+from app.routers.categories import system_category_id
+
+# Tables that grow with users or history and must never be fully scanned
+# by a per-user request
+LARGE_TABLES = {
+    "transactions",
+    "categories",
+    "budgets",
+    "budget_alerts",
+    "sync_tombstones",
+    "archive_rollups",
+    "transaction_archives",
+    "fx_rates",
+    "users",
+}
+
+# (method, path, json body, max statements), including the auth user lookup.
+# Budgets are steady-state: each endpoint is called once to warm process
+# caches before it is measured. Placeholders such as ``{transaction}`` are
+# replaced with rows created for each call (see FRESH_ROWS), so writes and
+# deletes never consume the seeded data.
+ENDPOINTS = [
+    ("POST", "/api/transactions/", {
+        "amount": 12.5, "type": "expense", "description": "PLAN CHECK", "category_id": "{category}",
+    }, 7),
+    ("GET", "/api/transactions/{transaction}", None, 2),
+    ("PUT", "/api/transactions/{transaction}", {"description": "x", "category_id": "{category}"}, 8),
+    ("DELETE", "/api/transactions/{transaction}", None, 7),
+    ("POST", "/api/transactions/auto-categorize", None, 3),
+    ("GET", "/api/transactions/", None, 3),
+    ("GET", "/api/transactions/?limit=1000", None, 3),
+    ("GET", "/api/transactions/?fast=true&fields=id,amount,date", None, 3),
+    ("GET", "/api/transactions/?type=expense&start_date=2024-01-01", None, 3),
+    ("GET", "/api/transactions/summary/monthly", None, 5),
+    ("PATCH", "/api/transactions/bulk", {"ids": ["missing"], "changes": {"description": "x"}}, 5),
+    # Filters that match nothing, so the seeded rows survive being measured
+    ("PATCH", "/api/transactions/bulk", {
+        "filter": {"type": "expense", "start_date": "2024-01-01", "description": "no such merchant"},
+        "changes": {"description": "x"},
+    }, 5),
+    ("DELETE", "/api/transactions/bulk", {
+        "filter": {"start_date": "2024-01-01", "description": "no such merchant"},
+    }, 6),
+    ("GET", "/api/categories/", None, 4),
+    ("GET", "/api/categories/?with_stats=true", None, 6),
+    ("PUT", "/api/categories/{category}", {"color": "#000000"}, 6),
+    # First customisation of a system category: copy-on-write moves its rows
+    ("PUT", "/api/categories/{system_category}", {"color": "#000000"}, 17),
+    ("DELETE", "/api/categories/{category}", None, 12),
+    ("DELETE", "/api/categories/{category}?reassign_to={target}", None, 13),
+    ("GET", "/api/budgets/", None, 2),
+    ("GET", "/api/budgets/alerts", None, 2),
+    ("GET", "/api/analytics/dashboard", None, 8),
+    ("GET", "/api/analytics/trends?months=12", None, 3),
+    ("GET", "/api/sync/?since=1&limit=100", None, 12),
+    ("GET", "/api/events/", None, 1),
+]
+
+ENDPOINT_IDS = [f"{method} {path}" + (" filter" if body and "filter" in body else "")
+                for method, path, body, _ in ENDPOINTS]
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+def _table_name(name: str) -> str:
+    # SQLAlchemy aliases repeated tables as <table>_1, <table>_2, ...
+    return re.sub(r"_\d+$", "", name)
+
+
+def _explain_sqlite(conn, statement, parameters):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        match = _SQLITE_SCAN.match(detail)
+        if match and _table_name(match.group(1)) in LARGE_TABLES:
+            problems.append(detail)
+    return problems
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _explain_postgres(conn, statement, parameters, max_rows):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems = []
+    for node in _plan_nodes(plan[0]["Plan"]):
+        table = node.get("Relation Name")
+        if table not in LARGE_TABLES:
+            continue
+        if node["Node Type"] == "Seq Scan":
+            problems.append(f"Seq Scan on {table}")
+        if node.get("Plan Rows", 0) > max_rows:
+            problems.append(f"{node['Node Type']} on {table} expects {node['Plan Rows']} rows")
+    return problems
+
+
+def _explain(statement, parameters, max_rows):
+    if not re.match(r"\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b", statement, re.IGNORECASE):
+        return []
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return _explain_postgres(conn, statement, parameters, max_rows)
+        return _explain_sqlite(conn, statement, parameters)
+
+
+def _fresh_transaction(db, user_id):
+    transaction = Transaction(amount=1.0, type="expense", description="PLAN CHECK", user_id=user_id)
+    db.add(transaction)
+    db.flush()
+    return transaction.id
+
+
+def _fresh_category(db, user_id):
+    """A category with a few transactions and a budget for reassignments to move"""
+    category = Category(name="Plan check", type="expense", user_id=user_id)
+    db.add(category)
+    db.flush()
+    for _ in range(3):
+        db.add(Transaction(amount=1.0, type="expense", category_id=category.id, user_id=user_id))
+    db.add(Budget(name="Plan check", amount=10.0, category_id=category.id, user_id=user_id))
+    return category.id
+
+
+def _fresh_system_category(db, user_id):
+    """A system category the user hasn't customised yet, with one transaction in it"""
+    category_id = system_category_id("expense", "Other")
+    copy = db.query(Category).filter(Category.user_id == user_id, Category.system_category_id == category_id)
+    for category in copy.all():
+        db.delete(category)
+    db.add(Transaction(amount=1.0, type="expense", category_id=category_id, user_id=user_id))
+    return category_id
+
+
+FRESH_ROWS = {
+    "transaction": _fresh_transaction,
+    "category": _fresh_category,
+    "target": _fresh_category,
+    "system_category": _fresh_system_category,
+}
+
+
+def _fill(path, body, user_id):
+    """Replace placeholders with ids of rows created for this call only"""
+    db = SessionLocal()
+    try:
+        ids = {}
+
+        def fresh(match):
+            name = match.group(1)
+            if name not in ids:
+                ids[name] = FRESH_ROWS[name](db, user_id)
+            return ids[name]
+
+        def fill(value):
+            if isinstance(value, str):
+                return re.sub(r"\{(\w+)\}", fresh, value)
+            if isinstance(value, dict):
+                return {key: fill(item) for key, item in value.items()}
+            return value
+
+        path, body = fill(path), fill(body)
+        db.commit()
+    finally:
+        db.close()
+    return path, body
+
+
+def _open_stream(auth_headers, path):
+    """Open an event stream, wait for its first event and disconnect.
+
+    TestClient waits for the whole response body, which a stream never ends,
+    so this drives the ASGI app directly.
+    """
+    from app.main import app
+
+    async def run():
+        first_event = asyncio.Event()
+        status = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await first_event.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+            elif message.get("body"):
+                first_event.set()
+
+        await app({
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+            "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(key.lower().encode(), value.encode()) for key, value in auth_headers.items()],
+            "client": ("testclient", 50000), "server": ("testserver", 80),
+        }, receive, send)
+        return status
+
+    assert asyncio.run(run()) == [200]
+
+
+def _call(client, auth_headers, method, path, body):
+    if path.startswith("/api/events"):
+        return _open_stream(auth_headers, path)
+    response = client.request(method, path, headers=auth_headers, json=body)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def _record(client, auth_headers, query_recorder, user_id, method, path, body):
+    _call(client, auth_headers, method, *_fill(path, body, user_id))  # warm caches
+    path, body = _fill(path, body, user_id)
+    query_recorder.start()
+    try:
+        _call(client, auth_headers, method, path, body)
+    finally:
+        statements = query_recorder.stop()
+    return statements
+
+
+@pytest.mark.parametrize("method,path,body,max_statements", ENDPOINTS, ids=ENDPOINT_IDS)
+def test_endpoint_query_count(client, auth_headers, seeded_users, query_recorder,
+                              method, path, body, max_statements):
+    statements = _record(client, auth_headers, query_recorder, seeded_users[0]["id"], method, path, body)
+    assert len(statements) <= max_statements, "\n\n".join(s for s, _ in statements)
+
+
+@pytest.mark.parametrize("method,path,body,max_statements", ENDPOINTS, ids=ENDPOINT_IDS)
+def test_endpoint_uses_indexes(client, auth_headers, seeded_users, query_recorder, seed_rows_per_user,
+                               method, path, body, max_statements):
+    statements = _record(client, auth_headers, query_recorder, seeded_users[0]["id"], method, path, body)
+    # Upper bound on rows the planner may expect to read from one table for
+    # a single user's request
+    max_rows = seed_rows_per_user * 2
+    problems = {}
+    for statement, parameters in statements:
+        found = _explain(statement, parameters, max_rows)
+        if found:
+            problems[statement] = found
+    assert not problems, "\n\n".join(f"{s}\n  -> {p}" for s, p in problems.items())
+
+
+def test_budget_evaluation_is_set_based(seeded_users, query_recorder, seed_rows_per_user):
+    from app.database import SessionLocal
+    from app.services.budget_alerts import ALERT_THRESHOLDS, evaluate_budgets
+    from app.services.budget_progress import PERIODS
+
+    db = SessionLocal()
+    try:
+        query_recorder.start()
+        try:
+            evaluate_budgets(db)
+        finally:
+            statements = query_recorder.stop()
+    finally:
+        db.close()
+
+    # One INSERT ... SELECT per period and threshold, whatever the budget count
+    assert len(statements) <= len(PERIODS) * len(ALERT_THRESHOLDS)
+    # The job walks every budget by design; everything it joins to must be
+    # an index lookup. It spans all users, so row estimates aren't bounded.
+    problems = [
+        p for s, params in statements for p in _explain(s, params, float("inf"))
+        if "budgets" not in p.split(" USING")[0]
+    ]
+    assert not problems, problems
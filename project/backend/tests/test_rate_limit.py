@@ -0,0 +1,100 @@
+"""Behavioural regression tests for admission control."""
+import asyncio
+import uuid
+
+import pytest
+
+from app.services import rate_limit
+
+
+@pytest.fixture
+def unreachable_redis_backend(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "backend", rate_limit.RedisBackend("redis://127.0.0.1:1/0"))
+    monkeypatch.setattr(rate_limit, "fallback_backend", rate_limit.MemoryBackend())
+    monkeypatch.setattr(rate_limit, "_backend_down_until", 0.0)
+
+
+def test_register_fails_open_when_redis_is_down(client, unreachable_redis_backend):
+    name = f"test-{uuid.uuid4().hex[:12]}"
+    response = client.post("/api/auth/register", json={
+        "email": f"{name}@example.com",
+        "username": name,
+        "password": "correct horse battery staple",
+    })
+
+    assert response.status_code == 200, response.text
+
+
+def test_fallback_buckets_still_limit(client, new_user, unreachable_redis_backend, monkeypatch):
+    monkeypatch.setattr(rate_limit, "USER_BUCKET", (5.0, 0.001))
+
+    statuses = [
+        client.get("/api/analytics/dashboard", headers=new_user).status_code
+        for _ in range(2)
+    ]
+
+    assert statuses == [200, 429]
+
+
+class FailingBackend:
+    def __init__(self):
+        self.calls = 0
+
+    async def take(self, key, capacity, rate, cost):
+        self.calls += 1
+        raise ConnectionError("redis is down")
+
+
+def test_failing_backend_is_skipped_until_the_retry_interval(monkeypatch):
+    failing = FailingBackend()
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit, "backend", failing)
+    monkeypatch.setattr(rate_limit, "fallback_backend", rate_limit.MemoryBackend())
+    monkeypatch.setattr(rate_limit, "_backend_down_until", 0.0)
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+
+    async def take_twice():
+        return [await rate_limit._take("user:x", 10, 1, 1) for _ in range(2)]
+
+    assert asyncio.run(take_twice()) == [(True, 0.0), (True, 0.0)]
+    assert failing.calls == 1
+
+    clock[0] += rate_limit.REDIS_RETRY_INTERVAL
+    asyncio.run(take_twice())
+    assert failing.calls == 2
+
+
+def test_memory_buckets_are_dropped_once_refilled(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    memory = rate_limit.MemoryBackend()
+
+    async def take(key, cost=1):
+        return await memory.take(key, 10, 1, cost)
+
+    for i in range(100):
+        asyncio.run(take(f"ip:{i}"))
+    clock[0] += rate_limit.PRUNE_INTERVAL - 1
+    asyncio.run(take("user:busy", cost=10))
+    assert len(memory) == 101
+
+    # The one-token buckets refilled long ago; the drained one needs 10s more
+    clock[0] += 1
+    asyncio.run(take("ip:new"))
+    assert len(memory) == 2
+
+    # It kept its state: one second refilled one token, not all ten
+    allowed, _ = asyncio.run(take("user:busy", cost=5))
+    assert not allowed
+
+
+def test_heavy_query_rejects_when_slots_are_taken(client, new_user, monkeypatch):
+    slots = asyncio.Semaphore(1)
+    monkeypatch.setattr(rate_limit, "_heavy_slots", slots)
+    asyncio.run(slots.acquire())
+
+    response = client.get("/api/analytics/dashboard", headers=new_user)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
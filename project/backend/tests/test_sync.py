@@ -0,0 +1,42 @@
+"""Behavioural regression tests for delta sync."""
+
+
+def _sync(client, headers, since):
+    response = client.get(f"/api/sync/?since={since}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _category_ids(client, headers):
+    response = client.get("/api/categories/", headers=headers)
+    assert response.status_code == 200, response.text
+    return {category["id"] for category in response.json()}
+
+
+def test_full_sync_includes_system_categories(client, new_user):
+    changes = _sync(client, new_user, 0)
+
+    synced = {category["id"] for category in changes["categories"]["upserted"]}
+    assert synced
+    assert synced == _category_ids(client, new_user)
+
+
+def test_customising_and_restoring_a_system_category_syncs(client, new_user):
+    version = _sync(client, new_user, 0)["version"]
+    system = next(
+        c for c in client.get("/api/categories/", headers=new_user).json() if c["is_system"]
+    )
+
+    # Copy-on-write hides the system category behind the user's copy
+    copy = client.put(f"/api/categories/{system['id']}", headers=new_user, json={"color": "#000000"}).json()
+    changes = _sync(client, new_user, version)
+    assert system["id"] in changes["categories"]["deleted"]
+    assert copy["id"] in {c["id"] for c in changes["categories"]["upserted"]}
+
+    # Deleting the copy shows the system category again
+    version = changes["version"]
+    assert client.delete(f"/api/categories/{copy['id']}", headers=new_user).status_code == 200
+    changes = _sync(client, new_user, version)
+    assert copy["id"] in changes["categories"]["deleted"]
+    assert system["id"] in {c["id"] for c in changes["categories"]["upserted"]}
+    assert system["id"] in _category_ids(client, new_user)
@@ -0,0 +1,156 @@
+"""Behavioural regression tests for the transaction endpoints."""
+from datetime import datetime
+
+import pytest
+
+from app.database import Account, Category, SessionLocal, Transaction, User
+from app.services import archive, categorizer, events
+
+
+def test_create_does_not_train_or_predict(client, new_user, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("single creates must not touch the categorizer")
+
+    monkeypatch.setattr(categorizer, "get_model", fail)
+
+    response = client.post("/api/transactions/", headers=new_user, json={
+        "amount": 4.5,
+        "description": "STARBUCKS 123",
+        "type": "expense",
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["category_id"] is None
+
+
+def _create(client, headers, **fields):
+    body = {"amount": 10.0, "description": "RENT", "type": "expense", **fields}
+    response = client.post("/api/transactions/", headers=headers, json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _count(client, headers):
+    response = client.get("/api/transactions/?fast=true&fields=id", headers=headers)
+    assert response.status_code == 200, response.text
+    return len(response.json())
+
+
+@pytest.mark.parametrize("body", [
+    {"filter": {}},
+    {"filter": {"description": "", "type": None}},
+    {"ids": []},
+])
+def test_bulk_delete_requires_a_real_selection(client, new_user, body):
+    _create(client, new_user)
+    _create(client, new_user)
+
+    response = client.request("DELETE", "/api/transactions/bulk", headers=new_user, json=body)
+
+    assert response.status_code == 400
+    assert _count(client, new_user) == 2
+
+
+@pytest.mark.parametrize("changes", [{"amount": None}, {"type": None}, {"date": None}])
+def test_updates_reject_null_required_fields(client, new_user, changes):
+    transaction = _create(client, new_user)
+
+    bulk = client.patch("/api/transactions/bulk", headers=new_user, json={
+        "ids": [transaction["id"]], "changes": changes,
+    })
+    single = client.put(f"/api/transactions/{transaction['id']}", headers=new_user, json=changes)
+
+    assert bulk.status_code == 400
+    assert single.status_code == 400
+
+
+def test_bulk_filter_refuses_archived_ranges(client, new_user):
+    old = datetime(datetime.utcnow().year - 5, 6, 1)
+    transaction = _create(client, new_user, date=old.isoformat())
+    _create(client, new_user)
+    db = SessionLocal()
+    try:
+        user_id = db.query(Transaction.user_id).filter(Transaction.id == transaction["id"]).scalar()
+        assert archive.archive_year(db, user_id, old.year) == 1
+    finally:
+        db.close()
+
+    reaching = client.request("DELETE", "/api/transactions/bulk", headers=new_user, json={
+        "filter": {"description": "rent"},
+    })
+    online_only = client.request("DELETE", "/api/transactions/bulk", headers=new_user, json={
+        "filter": {"description": "rent", "start_date": f"{old.year + 1}-01-01"},
+    })
+
+    assert reaching.status_code == 400
+    assert online_only.status_code == 200, online_only.text
+    assert online_only.json()["deleted"] == 1
+
+
+def _user_id(client, headers):
+    return client.get("/api/auth/me", headers=headers).json()["id"]
+
+
+def test_bulk_update_checks_the_values_it_writes(client, new_user):
+    transaction = _create(client, new_user)
+    mine = client.post("/api/categories/", headers=new_user, json={"name": "Mine", "type": "expense"}).json()
+    user_id = _user_id(client, new_user)
+    db = SessionLocal()
+    try:
+        someone_else = db.query(User.id).filter(User.id != user_id).first().id
+        theirs = Category(name="Theirs", type="expense", user_id=someone_else)
+        account = Account(name="Card", type="credit", currency="EUR", user_id=user_id)
+        db.add_all([theirs, account])
+        db.commit()
+        theirs_id, account_id = theirs.id, account.id
+    finally:
+        db.close()
+
+    def bulk(changes):
+        return client.patch("/api/transactions/bulk", headers=new_user, json={
+            "ids": [transaction["id"]], "changes": changes,
+        })
+
+    assert bulk({"category_id": theirs_id}).status_code == 404
+    assert bulk({"account_id": "no-such-account"}).status_code == 404
+    assert bulk({"category_id": mine["id"], "account_id": account_id}).status_code == 200
+
+    updated = client.get(f"/api/transactions/{transaction['id']}", headers=new_user).json()
+    assert updated["category_id"] == mine["id"]
+    assert updated["account_id"] == account_id
+    assert updated["currency"] == "EUR"
+
+
+class RecordingHub:
+    def __init__(self):
+        self.events = []
+
+    async def wants(self, user_id):
+        return True
+
+    async def publish(self, user_id, event):
+        self.events.append(event)
+
+
+def test_bulk_writes_publish_the_affected_aggregates(client, new_user, monkeypatch):
+    march = _create(client, new_user, date=f"{datetime.utcnow().year - 1}-03-10T00:00:00")
+    _create(client, new_user, date=f"{datetime.utcnow().year - 1}-05-10T00:00:00")
+    hub = RecordingHub()
+    monkeypatch.setattr(events, "hub", hub)
+
+    response = client.patch("/api/transactions/bulk", headers=new_user, json={
+        "ids": [march["id"]], "changes": {"date": f"{datetime.utcnow().year - 1}-04-10T00:00:00"},
+    })
+    assert response.status_code == 200, response.text
+    assert [e["type"] for e in hub.events] == ["transactions.bulk_updated", "monthly_totals", "monthly_totals"]
+    assert {e["month"] for e in hub.events[1:]} == {3, 4}
+
+    hub.events.clear()
+    response = client.request("DELETE", "/api/transactions/bulk", headers=new_user, json={
+        "filter": {"description": "rent"},
+    })
+    assert response.status_code == 200, response.text
+    assert hub.events[0] == {"type": "transactions.bulk_deleted", "count": 2}
+    totals = {e["month"]: e for e in hub.events[1:]}
+    assert set(totals) == {4, 5}
+    assert all(e["expenses"] == 0 for e in totals.values())